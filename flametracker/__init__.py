@@ -1,3 +1,11 @@
+from os import environ as _environ
+
 from .core import Tracker, action, event, wrap, file_flamegraph
+from .listeners import Listener
+
+__all__ = ("Tracker", "Listener", "action", "event", "wrap", "file_flamegraph")
+
+if _environ.get("FLAMETRACKER_IMPORTS"):
+    from .imports import profile_from_environment
 
-__all__ = ("Tracker", "action", "event", "wrap", "file_flamegraph")
+    profile_from_environment()
@@ -0,0 +1,235 @@
+import os
+import runpy
+import signal
+import sys
+from argparse import REMAINDER, ArgumentParser
+from contextlib import contextmanager
+
+from flametracker.core import Tracker
+from flametracker.instrument import Instrumenter, Sampler
+
+SUFFIXES = {
+    "flamegraph": ".flamegraph.html",
+    "text": ".txt",
+    "folded": ".folded",
+    "trace": ".trace.json",
+}
+"""Suffix appended to the output path for each output format."""
+
+
+@contextmanager
+def measured(tracker: Tracker):
+    """
+    Temporarily gives the running actions of a tracker the duration elapsed
+    since they started, so they can be rendered before they end.
+
+    Args:
+        tracker: The tracker whose running actions are measured.
+    """
+    now = tracker.clock()
+    running = []
+    node = tracker.current
+    while node is not None and node.end == 0:
+        running.append((node, node.elapsed))
+        node.elapsed = now - node.start
+        node = node.parent
+    try:
+        yield
+    finally:
+        for node, elapsed in running:
+            node.elapsed = elapsed
+
+
+def write_outputs(tracker: Tracker, args, sampler: "Sampler | None" = None):
+    """
+    Writes the requested outputs of a tracker.
+
+    Args:
+        tracker: The tracker to render.
+        args: The parsed command-line options.
+        sampler: The sampler adding to the tracker, if any.
+    """
+    if sampler is not None:
+        sampler.lock.acquire()
+    try:
+        with measured(tracker):
+            for output in args.format or ["flamegraph"]:
+                if output == "flamegraph":
+                    text = tracker.to_flamegraph(
+                        args.group_min_percent,
+                        args.splited,
+                        offline=args.offline,
+                        compress=args.compress,
+                        merge_siblings=args.merge_siblings,
+                    )
+                elif output == "text":
+                    text = tracker.to_str(
+                        args.group_min_percent, merge_siblings=args.merge_siblings
+                    )
+                elif output == "folded":
+                    text = tracker.to_folded(args.merge_siblings)
+                else:
+                    from json import dumps
+
+                    text = dumps(tracker.to_trace())
+
+                with open(args.output + SUFFIXES[output], "w", encoding="utf-8") as f:
+                    f.write(text)
+    finally:
+        if sampler is not None:
+            sampler.lock.release()
+
+
+def main(argv: "list[str] | None" = None):
+    """
+    Runs a script or module inside a tracker and writes its outputs when it
+    ends, or each time the process receives SIGUSR1.
+
+    Args:
+        argv: The command-line arguments, `sys.argv[1:]` by default.
+
+    Returns:
+        The exit status of the script.
+    """
+    parser = ArgumentParser(
+        prog="python -m flametracker",
+        description="Runs a Python script or module and records a flamegraph of it.",
+    )
+    parser.add_argument(
+        "-m", dest="module", action="store_true", help="Run the target as a module"
+    )
+    parser.add_argument(
+        "-o",
+        "--output",
+        default="flametracker",
+        help="Output path, completed by a suffix per format (default: flametracker)",
+    )
+    parser.add_argument(
+        "-f",
+        "--format",
+        action="append",
+        choices=sorted(SUFFIXES),
+        help="Output format, may be repeated (default: flamegraph)",
+    )
+    parser.add_argument(
+        "--group-min-percent",
+        type=float,
+        default=0.01,
+        help="Group short actions together (fraction of total time)",
+    )
+    parser.add_argument(
+        "--splited", action="store_true", help="Split the flamegraph by first action"
+    )
+    parser.add_argument(
+        "--merge-siblings",
+        action="store_true",
+        help="Merge all siblings of the same group",
+    )
+    parser.add_argument(
+        "--offline", action="store_true", help="Inline the flamegraph viewer"
+    )
+    parser.add_argument(
+        "--compress", action="store_true", help="Compress the flamegraph payload"
+    )
+    parser.add_argument(
+        "--imports", action="store_true", help="Record the imports of the target"
+    )
+    parser.add_argument(
+        "--gc", action="store_true", help="Record the garbage collection pauses"
+    )
+    parser.add_argument(
+        "--blocking",
+        action="store_true",
+        help="Record the file, socket, subprocess and lock waits",
+    )
+    parser.add_argument(
+        "--blocking-aggregate",
+        action="store_true",
+        help="Only count and time the blocking operations, per parent action",
+    )
+    recording = parser.add_mutually_exclusive_group()
+    recording.add_argument(
+        "-i",
+        "--instrument",
+        action="append",
+        metavar="PACKAGE",
+        help="Record every call of the functions of a package, may be repeated",
+    )
+    recording.add_argument(
+        "-s",
+        "--sample",
+        type=float,
+        metavar="SECONDS",
+        help="Sample the stack at this interval instead of recording calls",
+    )
+    parser.add_argument("target", help="The script path, or module name with -m")
+    parser.add_argument("args", nargs=REMAINDER, help="Arguments of the target")
+    args = parser.parse_args(argv)
+
+    saved_argv, saved_path = sys.argv, sys.path[:]
+    sys.argv = [args.target, *args.args]
+    if not args.module:
+        sys.path.insert(0, os.path.dirname(os.path.abspath(args.target)))
+
+    tracker = Tracker(track_gc=args.gc)
+    sampler = Sampler(tracker, args.sample) if args.sample else None
+    handler = None
+    if hasattr(signal, "SIGUSR1"):
+        handler = signal.signal(
+            signal.SIGUSR1, lambda *_: write_outputs(tracker, args, sampler)
+        )
+
+    status = 0
+    try:
+        with tracker:
+            try:
+                if args.imports:
+                    from flametracker.imports import install
+
+                    hook = install(tracker)
+                if args.blocking or args.blocking_aggregate:
+                    from flametracker.blocking import BlockingInstrumenter
+
+                    blocking = BlockingInstrumenter(args.blocking_aggregate)
+                    blocking.install()
+                if sampler is not None:
+                    sampler.start()
+                if args.instrument:
+                    with Instrumenter(tracker, args.instrument):
+                        run(args.target, args.module)
+                else:
+                    run(args.target, args.module)
+            except SystemExit as exit:
+                status = exit.code
+            finally:
+                if sampler is not None:
+                    sampler.stop()
+                if args.imports:
+                    hook.uninstall()
+                if args.blocking or args.blocking_aggregate:
+                    blocking.uninstall()
+    finally:
+        if handler is not None:
+            signal.signal(signal.SIGUSR1, handler)
+        sys.argv, sys.path[:] = saved_argv, saved_path
+        write_outputs(tracker, args, sampler)
+
+    return status
+
+
+def run(target: str, module: bool):
+    """
+    Runs a script or module as `__main__`.
+
+    Args:
+        target: The script path or module name.
+        module: Whether the target is a module name.
+    """
+    if module:
+        runpy.run_module(target, run_name="__main__", alter_sys=True)
+    else:
+        runpy.run_path(target, run_name="__main__")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,400 @@
+from typing import TYPE_CHECKING
+
+from flametracker.tracking import ActionNode, AggregateNode
+from flametracker.types import Tracker
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError as error:
+        raise ImportError(
+            "flametracker.analytics requires NumPy, "
+            "install it with `pip install flametracker[analytics]`"
+        ) from error
+    return numpy
+
+
+class Recording:
+    """
+    A recording exported to columnar NumPy arrays, one row per timed node in
+    preorder, so it can be analyzed with vectorized operations.
+
+    Times are integer nanoseconds, and `start` and `end` are relative to the
+    start of the first root. Events, which are not timed, are left out.
+    """
+
+    __slots__ = (
+        "groups",
+        "parent",
+        "depth",
+        "group",
+        "start",
+        "end",
+        "elapsed",
+        "self_time",
+        "count",
+        "_paths",
+    )
+
+    def __init__(
+        self,
+        groups: "list[str]",
+        parent: "np.ndarray",
+        group: "np.ndarray",
+        start: "np.ndarray",
+        elapsed: "np.ndarray",
+        count: "np.ndarray",
+    ):
+        """
+        Creates a recording from its columns, computing the derived ones.
+
+        Args:
+            groups: The names of the groups, indexed by the `group` column.
+            parent: The row of the parent of each node, -1 for roots. Parents
+                come before their children.
+            group: The group id of each node.
+            start: The start of each node.
+            elapsed: The duration of each node.
+            count: The number of actions folded in each node, 1 for actions.
+        """
+        np = _numpy()
+        self.groups = groups
+        self.parent = np.asarray(parent, dtype=np.int64)
+        self.group = np.asarray(group, dtype=np.int64)
+        self.start = np.asarray(start, dtype=np.int64)
+        self.elapsed = np.asarray(elapsed, dtype=np.int64)
+        self.end = self.start + self.elapsed
+        self.count = np.asarray(count, dtype=np.int64)
+
+        has_parent = self.parent >= 0
+        children_elapsed = np.zeros(len(self.parent), dtype=np.int64)
+        np.add.at(
+            children_elapsed, self.parent[has_parent], self.elapsed[has_parent]
+        )
+        self.self_time = self.elapsed - children_elapsed
+
+        self.depth = np.zeros(len(self.parent), dtype=np.int64)
+        for _, alive in self._ancestors():
+            self.depth[alive] += 1
+        self._paths: "tuple | None" = None
+
+    def __len__(self):
+        return len(self.parent)
+
+    @property
+    def id(self) -> "np.ndarray":
+        """
+        The id of each node, which is its row.
+        """
+        return _numpy().arange(len(self.parent))
+
+    @staticmethod
+    def from_action(root: "ActionNode") -> "Recording":
+        """
+        Exports an action and its subtree. Running actions last until now,
+        as in `Tracker.to_trace`.
+
+        Args:
+            root: The action to export.
+
+        Returns:
+            The recording of the subtree.
+        """
+        group_ids: "dict[str, int]" = {}
+        parents: "list[int]" = []
+        groups: "list[int]" = []
+        starts: "list[int]" = []
+        elapsed: "list[int]" = []
+        counts: "list[int]" = []
+
+        now = root.tracker.clock()
+        stack: "list[tuple[ActionNode, int]]" = [(root, -1)]
+        while stack:
+            action, parent = stack.pop()
+            if action.start == -1:
+                continue
+            row = len(parents)
+            parents.append(parent)
+            groups.append(group_ids.setdefault(action.group, len(group_ids)))
+            starts.append(action.start - root.start)
+            if isinstance(action, AggregateNode):
+                elapsed.append(action.elapsed)
+                counts.append(action.count)
+            else:
+                elapsed.append(action.elapsed if action.end else now - action.start)
+                counts.append(1)
+            stack.extend((child, row) for child in reversed(action.children))
+
+        return Recording(list(group_ids), parents, groups, starts, elapsed, counts)
+
+    @staticmethod
+    def from_tracker(tracker: "Tracker") -> "Recording":
+        """
+        Exports the actions recorded by a tracker.
+
+        Args:
+            tracker: The tracker to export.
+
+        Returns:
+            The recording of the tracker.
+        """
+        return Recording.from_action(tracker.root)
+
+    @staticmethod
+    def from_trace(trace: dict) -> "Recording":
+        """
+        Imports a trace in the Trace Event Format, such as the output of
+        `Tracker.to_trace`. Complete events are nested by time within each
+        process and thread.
+
+        Args:
+            trace: The trace, with its events in `traceEvents`.
+
+        Returns:
+            The recording of the trace.
+        """
+        events = sorted(
+            (
+                event
+                for event in trace["traceEvents"]
+                if event.get("ph") == "X" and "dur" in event
+            ),
+            key=lambda event: (
+                event.get("pid", 0),
+                event.get("tid", 0),
+                event["ts"],
+                -event["dur"],
+            ),
+        )
+
+        group_ids: "dict[str, int]" = {}
+        parents: "list[int]" = []
+        groups: "list[int]" = []
+        starts: "list[int]" = []
+        elapsed: "list[int]" = []
+        counts: "list[int]" = []
+        origin = round(events[0]["ts"] * 1000) if events else 0
+
+        stack: "list[tuple[int, tuple, int]]" = []
+        for event in events:
+            thread = (event.get("pid", 0), event.get("tid", 0))
+            start = round(event["ts"] * 1000) - origin
+            duration = round(event["dur"] * 1000)
+            end = start + duration
+            while stack and (stack[-1][1] != thread or stack[-1][2] < end):
+                stack.pop()
+
+            row = len(parents)
+            parents.append(stack[-1][0] if stack else -1)
+            groups.append(group_ids.setdefault(event["name"], len(group_ids)))
+            starts.append(start)
+            elapsed.append(duration)
+            counts.append(event.get("args", {}).get("count", 1))
+            stack.append((row, thread, end))
+
+        return Recording(list(group_ids), parents, groups, starts, elapsed, counts)
+
+    def select(self, mask: "np.ndarray") -> "Recording":
+        """
+        Keeps some of the nodes. Nodes whose parent is dropped become roots.
+
+        Args:
+            mask: A boolean array, or the rows to keep in increasing order.
+
+        Returns:
+            A recording of the kept nodes.
+        """
+        np = _numpy()
+        rows = np.flatnonzero(mask) if np.asarray(mask).dtype == bool else mask
+        rows = np.asarray(rows, dtype=np.int64)
+        # The extra last row maps the -1 parent of roots to -1
+        new_rows = np.full(len(self) + 1, -1, dtype=np.int64)
+        new_rows[rows] = np.arange(len(rows))
+        return Recording(
+            self.groups,
+            new_rows[self.parent[rows]],
+            self.group[rows],
+            self.start[rows],
+            self.elapsed[rows],
+            self.count[rows],
+        )
+
+    def window(self, start: int, end: int) -> "Recording":
+        """
+        Keeps the nodes running during a time window.
+
+        Args:
+            start: The start of the window.
+            end: The end of the window.
+
+        Returns:
+            A recording of the nodes overlapping the window.
+        """
+        return self.select((self.start < end) & (self.end > start))
+
+    def group_totals(self) -> "dict[str, np.ndarray]":
+        """
+        Sums the nodes of each group.
+
+        The total time of a group only counts its outermost nodes, so the time
+        of recursive calls is not counted twice.
+
+        Returns:
+            Columns `group` (names), `count`, `elapsed` and `self_time`, one
+            row per group, sorted by decreasing total time.
+        """
+        np = _numpy()
+        size = len(self.groups)
+
+        recursive = np.zeros(len(self), dtype=bool)
+        for ancestor, alive in self._ancestors():
+            recursive[alive] |= self.group[ancestor[alive]] == self.group[alive]
+
+        totals = {
+            "group": np.array(self.groups, dtype=object),
+            "count": np.bincount(self.group, self.count, size).astype(np.int64),
+            "elapsed": np.zeros(size, dtype=np.int64),
+            "self_time": np.zeros(size, dtype=np.int64),
+        }
+        outer = ~recursive
+        np.add.at(totals["elapsed"], self.group[outer], self.elapsed[outer])
+        np.add.at(totals["self_time"], self.group, self.self_time)
+
+        order = np.argsort(-totals["elapsed"], kind="stable")
+        return {name: column[order] for name, column in totals.items()}
+
+    def paths(self) -> "np.ndarray":
+        """
+        Identifies the path of groups from the root to each node.
+
+        Returns:
+            The path id of each node, usable with `path_name`.
+        """
+        np = _numpy()
+        if self._paths is not None:
+            return self._paths[0]
+
+        node_paths = np.zeros(len(self), dtype=np.int64)
+        path_parents = np.zeros(0, dtype=np.int64)
+        path_groups = np.zeros(0, dtype=np.int64)
+        for depth in range(int(self.depth.max()) + 1 if len(self) else 0):
+            rows = np.flatnonzero(self.depth == depth)
+            parent_paths = (
+                np.full(len(rows), -1, dtype=np.int64)
+                if depth == 0
+                else node_paths[self.parent[rows]]
+            )
+            keys, inverse = np.unique(
+                np.stack([parent_paths, self.group[rows]]),
+                axis=1,
+                return_inverse=True,
+            )
+            node_paths[rows] = len(path_parents) + inverse.reshape(-1)
+            path_parents = np.concatenate([path_parents, keys[0]])
+            path_groups = np.concatenate([path_groups, keys[1]])
+
+        self._paths = (node_paths, path_parents, path_groups)
+        return node_paths
+
+    def path_name(self, path: int) -> str:
+        """
+        Names a path identified by `paths`.
+
+        Args:
+            path: The path id.
+
+        Returns:
+            The groups of the path, separated by semicolons.
+        """
+        self.paths()
+        _, path_parents, path_groups = self._paths  # type: ignore
+        names = []
+        while path >= 0:
+            names.append(self.groups[path_groups[path]])
+            path = int(path_parents[path])
+        return ";".join(reversed(names))
+
+    def top_paths(self, n: int = 10, column: str = "self_time"):
+        """
+        Finds the paths of groups totaling the most time.
+
+        Args:
+            n: The number of paths to return.
+            column: The time summed per path, `self_time` or `elapsed`.
+
+        Returns:
+            A list of `(path, total, count)` tuples, by decreasing total.
+        """
+        np = _numpy()
+        paths = self.paths()
+        size = len(self._paths[1])  # type: ignore
+        totals = np.zeros(size, dtype=np.int64)
+        np.add.at(totals, paths, getattr(self, column))
+        counts = np.bincount(paths, self.count, size).astype(np.int64)
+
+        top = np.argsort(-totals, kind="stable")[:n]
+        return [
+            (self.path_name(int(path)), int(totals[path]), int(counts[path]))
+            for path in top
+        ]
+
+    def outliers(self, threshold: float = 3.5, column: str = "elapsed") -> "np.ndarray":
+        """
+        Finds the nodes much longer or shorter than the other nodes of their
+        group, by their modified z-score, based on the median and the median
+        absolute deviation of the group. Groups where most nodes take the same
+        time use the mean absolute deviation instead.
+
+        Args:
+            threshold: The minimum absolute score of an outlier.
+            column: The time compared, `elapsed` or `self_time`.
+
+        Returns:
+            The ids of the outliers, by decreasing absolute score.
+        """
+        np = _numpy()
+        values = getattr(self, column).astype(np.float64)
+        deviation = np.abs(values - self._group_medians(values)[self.group])
+
+        median_deviation = self._group_medians(deviation)
+        sizes = np.bincount(self.group, minlength=len(self.groups))
+        mean_deviation = np.bincount(
+            self.group, deviation, len(self.groups)
+        ) / np.maximum(sizes, 1)
+        spread = np.where(
+            median_deviation > 0,
+            median_deviation / 0.6745,
+            mean_deviation * 1.2533,
+        )[self.group]
+
+        score = np.zeros(len(self))
+        spread_rows = spread > 0
+        score[spread_rows] = deviation[spread_rows] / spread[spread_rows]
+        rows = np.flatnonzero(score > threshold)
+        return rows[np.argsort(-score[rows], kind="stable")]
+
+    def _ancestors(self):
+        # Yields the ancestors of all nodes one level up at a time, with the
+        # mask of the nodes that still have one
+        ancestor = self.parent.copy()
+        alive = ancestor >= 0
+        while alive.any():
+            yield ancestor, alive
+            ancestor[alive] = self.parent[ancestor[alive]]
+            alive = ancestor >= 0
+
+    def _group_medians(self, values: "np.ndarray") -> "np.ndarray":
+        np = _numpy()
+        order = np.lexsort((values, self.group))
+        sizes = np.bincount(self.group, minlength=len(self.groups))
+        firsts = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        present = sizes > 0
+        medians = np.zeros(len(self.groups))
+        low = firsts[present] + (sizes[present] - 1) // 2
+        high = firsts[present] + sizes[present] // 2
+        medians[present] = (values[order[low]] + values[order[high]]) / 2
+        return medians
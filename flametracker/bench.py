@@ -0,0 +1,425 @@
+import json
+import sys
+from argparse import ArgumentParser
+from importlib import import_module
+from math import pi, sqrt, tan
+from statistics import NormalDist, mean, median, stdev
+from typing import Callable
+
+from flametracker.core import Tracker
+from flametracker.tracking import ActionNode, AggregateNode
+
+
+def t_quantile(probability: float, freedom: float) -> float:
+    """
+    Approximates a quantile of the Student's t-distribution, exactly for one
+    and two degrees of freedom and by a Cornish-Fisher expansion above.
+
+    Args:
+        probability: The cumulative probability, above 0.5.
+        freedom: The degrees of freedom.
+
+    Returns:
+        The quantile.
+    """
+    if freedom <= 1:
+        return tan(pi * (probability - 0.5))
+    if freedom == 2:
+        return (2 * probability - 1) / sqrt(2 * probability * (1 - probability))
+    z = NormalDist().inv_cdf(probability)
+    terms = (
+        (z**3 + z) / 4,
+        (5 * z**5 + 16 * z**3 + 3 * z) / 96,
+        (3 * z**7 + 19 * z**5 + 17 * z**3 - 15 * z) / 384,
+        (79 * z**9 + 776 * z**7 + 1482 * z**5 - 1920 * z**3 - 945 * z) / 92160,
+    )
+    return z + sum(term / freedom**power for power, term in enumerate(terms, 1))
+
+
+def path_times(root: "ActionNode") -> "dict[str, tuple[int, int]]":
+    """
+    Sums the time and calls of the actions of a tree by path of groups.
+
+    Args:
+        root: The root of the tree.
+
+    Returns:
+        The total elapsed time in nanoseconds and number of calls of each path,
+        the groups of a path being separated by semicolons.
+    """
+    totals: "dict[str, tuple[int, int]]" = {}
+    stack: "list[tuple[ActionNode, str]]" = [(root, root.group)]
+    while stack:
+        action, path = stack.pop()
+        elapsed, calls = totals.get(path, (0, 0))
+        count = action.count if isinstance(action, AggregateNode) else 1
+        totals[path] = (elapsed + action.elapsed, calls + count)
+        stack.extend(
+            (child, path + ";" + child.group)
+            for child in action.children
+            if child.start != -1
+        )
+    return totals
+
+
+class PathStats:
+    """
+    Summarizes the time spent in a path of groups over the runs of a benchmark.
+    """
+
+    __slots__ = ("path", "samples", "calls", "mean", "stdev", "median", "interval")
+
+    def __init__(
+        self, path: str, samples: "list[float]", calls: int, confidence: float
+    ):
+        """
+        Creates the summary of a path.
+
+        Args:
+            path: The groups of the path, separated by semicolons.
+            samples: The time spent in the path by each run, in milliseconds.
+            calls: The number of calls of the path over all runs.
+            confidence: The confidence level of the interval of the mean.
+        """
+        self.path = path
+        self.samples = samples
+        self.calls = calls
+        self.mean = mean(samples)
+        self.stdev = stdev(samples) if len(samples) > 1 else 0.0
+        self.median = median(samples)
+        self.interval = (
+            t_quantile((1 + confidence) / 2, len(samples) - 1)
+            * self.stdev
+            / sqrt(len(samples))
+        )
+
+    def to_dict(self) -> dict:
+        """
+        Converts the summary into a dictionary that can be serialized to JSON.
+
+        Returns:
+            A dictionary representation of the summary.
+        """
+        return {
+            "samples": self.samples,
+            "calls": self.calls,
+            "mean": self.mean,
+            "stdev": self.stdev,
+            "median": self.median,
+            "interval": self.interval,
+        }
+
+    def is_slower(
+        self,
+        baseline: "PathStats",
+        confidence: float,
+        threshold: float,
+        min_difference: float,
+    ) -> bool:
+        """
+        Checks whether this path is significantly slower than in a baseline,
+        by a one-sided Welch's t-test on the mean time of the runs.
+
+        Args:
+            baseline: The summary of the same path in the baseline.
+            confidence: The confidence level of the test.
+            threshold: The minimum relative increase of the mean.
+            min_difference: The minimum increase of the mean in milliseconds.
+
+        Returns:
+            True if the path regressed.
+        """
+        difference = self.mean - baseline.mean
+        if difference < max(min_difference, threshold * baseline.mean):
+            return False
+
+        variance = self.stdev**2 / len(self.samples)
+        baseline_variance = baseline.stdev**2 / len(baseline.samples)
+        error = sqrt(variance + baseline_variance)
+        if error == 0:
+            return True
+        freedom = (variance + baseline_variance) ** 2 / (
+            (variance**2 / (len(self.samples) - 1) if len(self.samples) > 1 else 0)
+            + (
+                baseline_variance**2 / (len(baseline.samples) - 1)
+                if len(baseline.samples) > 1
+                else 0
+            )
+        )
+        return difference / error > t_quantile(confidence, freedom)
+
+
+class Benchmark:
+    """
+    Holds the per-path summaries of the runs of a benchmark, which can be
+    saved as a baseline and compared with later runs.
+    """
+
+    __slots__ = ("runs", "confidence", "paths")
+
+    def __init__(
+        self,
+        samples: "dict[str, list[float]]",
+        calls: "dict[str, int]",
+        confidence: float = 0.95,
+    ):
+        """
+        Creates a benchmark from the time spent in each path by each run.
+
+        Args:
+            samples: The time spent in each path by each run, in milliseconds.
+            calls: The number of calls of each path over all runs.
+            confidence: The confidence level of the intervals and comparisons.
+        """
+        self.runs = max((len(values) for values in samples.values()), default=0)
+        self.confidence = confidence
+        self.paths = {
+            path: PathStats(path, values, calls.get(path, 0), confidence)
+            for path, values in samples.items()
+        }
+
+    @staticmethod
+    def run(
+        target: Callable,
+        runs: int = 10,
+        warmup: int = 1,
+        confidence: float = 0.95,
+        min_length: "float | None" = None,
+        max_depth: "int | None" = None,
+    ) -> "Benchmark":
+        """
+        Calls a target repeatedly, each time in a new tracker, after some
+        warm-up calls whose times are discarded.
+
+        Args:
+            target: The function to benchmark, called without arguments.
+            runs: The number of timed calls.
+            warmup: The number of calls made first and discarded.
+            confidence: The confidence level of the intervals and comparisons.
+            min_length: Passed to the trackers, to aggregate short actions.
+            max_depth: Passed to the trackers, to aggregate deep actions.
+
+        Returns:
+            The summaries of the timed runs.
+        """
+        timed: "list[dict[str, tuple[int, int]]]" = []
+        for index in range(warmup + runs):
+            with Tracker(min_length, max_depth) as tracker:
+                target()
+            if index >= warmup:
+                timed.append(path_times(tracker.root))
+
+        # Paths missing from a run took no time in it
+        paths = dict.fromkeys(path for times in timed for path in times)
+        samples = {
+            path: [times.get(path, (0, 0))[0] / 1_000_000 for times in timed]
+            for path in paths
+        }
+        calls = {
+            path: sum(times.get(path, (0, 0))[1] for times in timed) for path in paths
+        }
+        return Benchmark(samples, calls, confidence)
+
+    def to_dict(self) -> dict:
+        """
+        Converts the benchmark into a dictionary that can be serialized to JSON.
+
+        Returns:
+            A dictionary representation of the benchmark.
+        """
+        return {
+            "runs": self.runs,
+            "confidence": self.confidence,
+            "paths": {path: stats.to_dict() for path, stats in self.paths.items()},
+        }
+
+    @staticmethod
+    def from_dict(data: dict) -> "Benchmark":
+        """
+        Creates a benchmark from its dictionary representation.
+
+        Args:
+            data: The dictionary created by `to_dict`.
+
+        Returns:
+            The benchmark.
+        """
+        return Benchmark(
+            {path: stats["samples"] for path, stats in data["paths"].items()},
+            {path: stats["calls"] for path, stats in data["paths"].items()},
+            data["confidence"],
+        )
+
+    def save(self, path: str):
+        """
+        Writes the benchmark to a JSON file, to use it as a baseline.
+
+        Args:
+            path: The path of the file.
+        """
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2)
+
+    @staticmethod
+    def load(path: str) -> "Benchmark":
+        """
+        Reads a benchmark written by `save`.
+
+        Args:
+            path: The path of the file.
+
+        Returns:
+            The benchmark.
+        """
+        with open(path, encoding="utf-8") as f:
+            return Benchmark.from_dict(json.load(f))
+
+    def regressions(
+        self,
+        baseline: "Benchmark",
+        threshold: float = 0.05,
+        min_difference: float = 0.01,
+    ) -> "list[str]":
+        """
+        Finds the paths significantly slower than in a baseline.
+
+        Args:
+            baseline: The benchmark to compare with.
+            threshold: The minimum relative increase of the mean time.
+            min_difference: The minimum increase of the mean time in milliseconds.
+
+        Returns:
+            The regressed paths, by decreasing increase of their mean time.
+        """
+        regressed = [
+            path
+            for path, stats in self.paths.items()
+            if path in baseline.paths
+            and stats.is_slower(
+                baseline.paths[path], self.confidence, threshold, min_difference
+            )
+        ]
+        return sorted(
+            regressed,
+            key=lambda path: baseline.paths[path].mean - self.paths[path].mean,
+        )
+
+    def to_str(self, baseline: "Benchmark | None" = None) -> str:
+        """
+        Formats the summaries as a table, with the change from a baseline.
+
+        Args:
+            baseline: The benchmark to compare with, if any.
+
+        Returns:
+            One line per path, by decreasing mean time.
+        """
+        lines = []
+        for stats in sorted(self.paths.values(), key=lambda stats: -stats.mean):
+            line = (
+                f"{stats.mean:.3f}ms ± {stats.interval:.3f}ms "
+                f"({stats.calls / max(self.runs, 1):g} calls)"
+            )
+            if baseline is not None:
+                previous = baseline.paths.get(stats.path)
+                if previous is None:
+                    line += " new"
+                elif previous.mean:
+                    line += f" {stats.mean / previous.mean - 1:+.1%}"
+            lines.append(f"{line} {stats.path}")
+        return "\n".join(lines)
+
+
+def load_target(name: str) -> Callable:
+    """
+    Imports a function named as `module:function`.
+
+    Args:
+        name: The module and qualified name of the function.
+
+    Returns:
+        The function.
+    """
+    module, _, qualname = name.partition(":")
+    target = import_module(module)
+    for attribute in qualname.split("."):
+        target = getattr(target, attribute)
+    return target
+
+
+def main(argv: "list[str] | None" = None) -> int:
+    """
+    Benchmarks a function and compares it with a baseline file, which is
+    created when missing.
+
+    Args:
+        argv: The command-line arguments, `sys.argv[1:]` by default.
+
+    Returns:
+        1 if a path regressed, 0 otherwise.
+    """
+    parser = ArgumentParser(
+        prog="python -m flametracker.bench",
+        description="Benchmarks a function and fails when it got slower.",
+    )
+    parser.add_argument("target", help="The function to run, as module:function")
+    parser.add_argument(
+        "-b",
+        "--baseline",
+        default="flametracker.bench.json",
+        help="Baseline file, written when missing (default: flametracker.bench.json)",
+    )
+    parser.add_argument(
+        "-n", "--runs", type=int, default=10, help="Timed runs (default: 10)"
+    )
+    parser.add_argument(
+        "-w", "--warmup", type=int, default=1, help="Warm-up runs (default: 1)"
+    )
+    parser.add_argument(
+        "--confidence",
+        type=float,
+        default=0.95,
+        help="Confidence level of the comparisons (default: 0.95)",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.05,
+        help="Minimum relative slowdown of a path (default: 0.05)",
+    )
+    parser.add_argument(
+        "--min-difference",
+        type=float,
+        default=0.01,
+        help="Minimum slowdown of a path in milliseconds (default: 0.01)",
+    )
+    parser.add_argument(
+        "--update", action="store_true", help="Replace the baseline with this run"
+    )
+    args = parser.parse_args(argv)
+
+    benchmark = Benchmark.run(
+        load_target(args.target), args.runs, args.warmup, args.confidence
+    )
+
+    try:
+        baseline = None if args.update else Benchmark.load(args.baseline)
+    except FileNotFoundError:
+        baseline = None
+    print(benchmark.to_str(baseline))
+
+    if baseline is None:
+        benchmark.save(args.baseline)
+        print(f"Baseline written to {args.baseline}")
+        return 0
+
+    regressions = benchmark.regressions(
+        baseline, args.threshold, args.min_difference
+    )
+    for path in regressions:
+        print(f"Regression: {path}", file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,362 @@
+import builtins
+import socket
+import subprocess
+import sys
+import threading
+from threading import get_ident
+
+from flametracker.core import Tracker
+from flametracker.instrument import frame_module, in_packages
+from flametracker.tracking import ActionNode
+
+_MISSING = object()
+
+SOCKET_METHODS = {
+    "recv": "socket.recv",
+    "recv_into": "socket.recv",
+    "recvfrom": "socket.recv",
+    "send": "socket.send",
+    "sendall": "socket.send",
+    "sendto": "socket.send",
+    "connect": "socket.connect",
+    "accept": "socket.accept",
+}
+"""Socket methods recorded, with the group of their actions."""
+
+SKIPPED_PACKAGES = ("flametracker", "threading", "queue", "subprocess")
+"""Modules skipped when naming call sites, as they wait on behalf of callers."""
+
+
+def call_site(depth: int = 1) -> str:
+    """
+    Names the first caller outside flametracker and the standard modules
+    waiting on behalf of their callers, as `module:line`.
+
+    Args:
+        depth: The number of frames to skip, including this function.
+
+    Returns:
+        The call site.
+    """
+    frame = sys._getframe(depth)
+    while frame.f_back is not None and in_packages(
+        frame_module(frame), SKIPPED_PACKAGES
+    ):
+        frame = frame.f_back
+    return f"{frame_module(frame)}:{frame.f_lineno}"
+
+
+def transferred(result, args: tuple) -> int:
+    """
+    Counts the bytes transferred by a read or write call.
+
+    Args:
+        result: The value returned by the call.
+        args: The positional arguments of the call.
+
+    Returns:
+        The number of bytes, or characters for text files, transferred.
+    """
+    if isinstance(result, tuple) and result:
+        result = result[0]
+    if isinstance(result, bool):
+        return 0
+    if isinstance(result, int):
+        return result
+    if isinstance(result, (bytes, bytearray, str)):
+        return len(result)
+    if isinstance(result, list):
+        return sum(len(line) for line in result)
+    if result is None:
+        for arg in args:
+            if isinstance(arg, (bytes, bytearray, str)):
+                return len(arg)
+            if isinstance(arg, memoryview):
+                return arg.nbytes
+    return 0
+
+
+class BlockingInstrumenter:
+    """
+    Records the blocking operations of the active tracker's thread as actions
+    under its current action: file reads and writes, socket transfers,
+    subprocess waits, and contended lock acquires and condition waits.
+
+    Transfers record their size in bytes as the `bytes` keyword argument, and
+    lock waits the lock, named after where it was created, and the call site
+    that waited. With `aggregate`, calls are only counted and timed in one
+    aggregate per group and parent, with lock waits grouped per lock, so the
+    instrumentation can stay on under load.
+
+    Only files opened and locks created while it is installed are recorded.
+    Files opened by the tracker's thread are wrapped in a `TimedFile` proxy,
+    which is not an instance of the `io` classes, while other threads get
+    the files unchanged.
+
+    Example:
+        with Tracker() as tracker, BlockingInstrumenter(aggregate=True):
+            serve()
+    """
+
+    def __init__(
+        self,
+        aggregate: bool = False,
+        files: bool = True,
+        sockets: bool = True,
+        subprocesses: bool = True,
+        locks: bool = True,
+    ):
+        """
+        Creates an uninstalled instrumenter.
+
+        Args:
+            aggregate: Whether to aggregate the calls instead of recording each.
+            files: Whether to record reads and writes of opened files.
+            sockets: Whether to record socket transfers, connects and accepts.
+            subprocesses: Whether to record the waits of subprocesses.
+            locks: Whether to record contended lock acquires and condition waits.
+        """
+        self.aggregate = aggregate
+        self.files = files
+        self.sockets = sockets
+        self.subprocesses = subprocesses
+        self.locks = locks
+        self._patches: "list[tuple[object, str, object]]" = []
+
+    def __enter__(self):
+        self.install()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.uninstall()
+
+    def install(self):
+        """
+        Patches the blocking operations.
+        """
+        instrumenter = self
+
+        if self.files:
+            open_file = builtins.open
+
+            def timed_open(*args, **kargs):
+                file = open_file(*args, **kargs)
+                tracker = Tracker._active_tracker
+                if tracker is None or tracker.thread != get_ident():
+                    return file
+                return TimedFile(file, instrumenter)
+
+            self._patch(builtins, "open", timed_open)
+
+        if self.sockets:
+            for name, group in SOCKET_METHODS.items():
+                self._patch(
+                    socket.socket,
+                    name,
+                    self._timed(
+                        getattr(socket.socket, name),
+                        group,
+                        name.startswith(("recv", "send")),
+                    ),
+                )
+
+        if self.subprocesses:
+            for name in ("wait", "communicate"):
+                self._patch(
+                    subprocess.Popen,
+                    name,
+                    self._timed(getattr(subprocess.Popen, name), "subprocess." + name),
+                )
+
+        if self.locks:
+            for name in ("Lock", "RLock"):
+                factory = getattr(threading, name)
+
+                def create_lock(factory=factory):
+                    return TimedLock(factory(), call_site(2), instrumenter)
+
+                self._patch(threading, name, create_lock)
+
+            wait = threading.Condition.wait
+
+            def timed_wait(condition, timeout=None):
+                return instrumenter.record(
+                    "condition.wait",
+                    (),
+                    {"site": call_site(2)},
+                    wait,
+                    (condition, timeout),
+                )
+
+            self._patch(threading.Condition, "wait", timed_wait)
+
+    def uninstall(self):
+        """
+        Restores the patched operations.
+        """
+        while self._patches:
+            owner, name, original = self._patches.pop()
+            if original is _MISSING:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+
+    def _patch(self, owner, name: str, replacement):
+        self._patches.append((owner, name, owner.__dict__.get(name, _MISSING)))
+        setattr(owner, name, replacement)
+
+    def _timed(self, function, group: str, sized: bool = False):
+        instrumenter = self
+
+        def timed(*args, **kargs):
+            return instrumenter.record(group, (), {}, function, args, kargs, sized)
+
+        return timed
+
+    def record(
+        self,
+        group: str,
+        args: tuple,
+        kargs: dict,
+        function,
+        call_args: tuple,
+        call_kargs: "dict | None" = None,
+        sized: bool = False,
+    ):
+        """
+        Calls a blocking function, recording it in the active tracker when
+        called from the tracker's thread.
+
+        Args:
+            group: The group of the action.
+            args: The positional arguments of the action.
+            kargs: The keyword arguments of the action.
+            function: The blocking function.
+            call_args: The positional arguments of the call.
+            call_kargs: The keyword arguments of the call.
+            sized: Whether to record the bytes transferred by the call.
+
+        Returns:
+            The result of the call.
+        """
+        tracker = Tracker._active_tracker
+        if tracker is None or tracker.current is None or tracker.thread != get_ident():
+            return function(*call_args, **(call_kargs or {}))
+
+        if self.aggregate:
+            if args:
+                group = f"{group} {args[0]}"
+            start = tracker.clock()
+            try:
+                result = function(*call_args, **(call_kargs or {}))
+            finally:
+                aggregate = tracker.aggregate(tracker.current, group)
+                aggregate.add(start, tracker.clock())
+            if sized:
+                aggregate.kargs["bytes"] = aggregate.kargs.get("bytes", 0) + (
+                    transferred(result, call_args)
+                )
+            return result
+
+        with ActionNode(tracker, tracker.current, group, args, kargs):
+            result = function(*call_args, **(call_kargs or {}))
+            if sized:
+                kargs["bytes"] = transferred(result, call_args)
+        return result
+
+
+class TimedFile:
+    """
+    Wraps an opened file to record its reads and writes.
+    """
+
+    def __init__(self, file, instrumenter: BlockingInstrumenter):
+        self._file = file
+        self._instrumenter = instrumenter
+
+    def __getattr__(self, name: str):
+        return getattr(self._file, name)
+
+    def __enter__(self):
+        self._file.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return self._file.__exit__(exc_type, exc_val, exc_tb)
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line = self.readline()
+        if not line:
+            raise StopIteration
+        return line
+
+    def _call(self, group: str, name: str, args: tuple, kargs: dict):
+        return self._instrumenter.record(
+            group,
+            (getattr(self._file, "name", None),),
+            {},
+            getattr(self._file, name),
+            args,
+            kargs,
+            True,
+        )
+
+    def read(self, *args, **kargs):
+        return self._call("file.read", "read", args, kargs)
+
+    def readinto(self, *args, **kargs):
+        return self._call("file.read", "readinto", args, kargs)
+
+    def readline(self, *args, **kargs):
+        return self._call("file.read", "readline", args, kargs)
+
+    def readlines(self, *args, **kargs):
+        return self._call("file.read", "readlines", args, kargs)
+
+    def write(self, *args, **kargs):
+        return self._call("file.write", "write", args, kargs)
+
+
+class TimedLock:
+    """
+    Wraps a lock to record the acquires that had to wait for it.
+    """
+
+    __slots__ = ("_lock", "name", "_instrumenter")
+
+    def __init__(self, lock, name: str, instrumenter: BlockingInstrumenter):
+        self._lock = lock
+        self.name = name
+        self._instrumenter = instrumenter
+
+    def __getattr__(self, name: str):
+        return getattr(self._lock, name)
+
+    def __repr__(self):
+        return f"<TimedLock {self.name} {self._lock!r}>"
+
+    def acquire(self, blocking: bool = True, timeout: float = -1):
+        if self._lock.acquire(False):
+            return True
+        if not blocking:
+            return False
+        return self._instrumenter.record(
+            "lock.acquire",
+            (self.name,),
+            {"site": call_site(2)},
+            self._lock.acquire,
+            (True, timeout),
+        )
+
+    def release(self):
+        self._lock.release()
+
+    def __enter__(self):
+        return self.acquire()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._lock.release()
+
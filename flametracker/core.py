@@ -1,13 +1,23 @@
+import gc
+from collections.abc import Iterator
 from contextlib import contextmanager
 from functools import wraps
-from typing import cast
-
-from flametracker.rendering import RenderNode
-from flametracker.tracking import ActionNode
+from math import frexp, ldexp
+from os import getpid
+from threading import get_ident
+from types import GeneratorType
+from typing import Callable, cast
+
+from flametracker.indexing import ActionIndex
+from flametracker.listeners import Dispatcher, Listener
+from flametracker.tracking import CLOCKS, ActionNode, AggregateNode
 from flametracker.types import F
 
 from . import UntrackedActionNode
 
+_CO_GENERATOR = 0x20
+"""The code flag of generator functions, as `inspect.CO_GENERATOR`."""
+
 
 class Tracker:
     """
@@ -17,29 +27,119 @@ class Tracker:
 
     _active_tracker: "Tracker|None" = None
 
-    def __init__(self):
+    def __init__(
+        self,
+        min_length: float | None = None,
+        max_depth: int | None = None,
+        clock: "str | Callable[[], int]" = "perf",
+        forward: bool = False,
+        name: str = "@root",
+        track_gc: bool = False,
+        index: bool = False,
+    ):
+        """
+        Creates an inactive tracker.
+
+        Args:
+            min_length: Actions shorter than this duration in milliseconds are
+                folded into an aggregate of their group when they exit.
+            max_depth: Actions deeper than this below the root are folded into
+                an aggregate of their group when they exit.
+            clock: The clock timing actions, either one of the names in
+                `flametracker.tracking.CLOCKS` or a function returning integer
+                nanoseconds.
+            forward: Whether to attach this tracker's root under the current
+                action of the tracker active when it is entered, so the outer
+                tracker shares its actions instead of missing them. The tracker
+                then uses the clock of the outer tracker, so the shared tree
+                has a single time base.
+            name: The group of the root action.
+            track_gc: Whether to record garbage collections running on the
+                tracker's thread as `@gc` actions under the current action, so
+                they are not counted in its own time.
+            index: Whether to index the actions by group and time as they end,
+                in `index`, to query them without scanning the tree.
+        """
         if not __debug__:
             raise RuntimeError("Tracker is disabled in optimized mode")
 
-        self.root = ActionNode(self, None, "@root", (), {})
+        self.clock = CLOCKS[clock] if isinstance(clock, str) else clock
+        self.root = ActionNode(self, None, name, (), {})
         self.current = None
+        self.forward = forward
+        self.outer: "Tracker | None" = None
+        self.min_length = min_length
+        self._min_elapsed = (
+            None if min_length is None else int(min_length * 1_000_000)
+        )
+        self.max_depth = max_depth
+        self.pruning = min_length is not None or max_depth is not None
+        self.dispatcher: "Dispatcher | None" = None
+        self._aggregates: "dict[ActionNode, dict[str, AggregateNode]]" = {}
+        self._renders: "dict[tuple, tuple[float, dict]]" = {}
+        self.track_gc = track_gc
+        self._gc_action: "ActionNode | None" = None
+        self.thread: "int | None" = None
+        self.index = ActionIndex(self) if index else None
 
     def __enter__(self):
         """
-        Activates the tracker, setting it as the active tracker.
+        Activates the tracker, setting it as the active tracker. The previously
+        active tracker is restored when this one is deactivated.
         """
-        assert Tracker._active_tracker is None
+        assert not self.is_active(), "Tracker is already active"
+        self.outer = Tracker._active_tracker
+        if self.forward and self.outer is not None and self.outer.current:
+            self.clock = self.outer.clock
+            self.root.parent = self.outer.current
+            self.root.parent.children.append(self.root)
+            self.current = self.root.parent
+
         Tracker._active_tracker = self
-        self.root.__enter__()
+        self._start()
         return self
 
+    def _start(self):
+        if self.dispatcher is not None:
+            self.dispatcher.start()
+        self.thread = get_ident()
+        self.root.__enter__()
+        if self.track_gc:
+            gc.callbacks.append(self._on_gc)
+
     def __exit__(self, exc_type, exc_val, exc_tb):
         """
         Deactivates the tracker and finalizes the root action node.
         """
         assert self.is_active()
+        if Tracker._active_tracker is self:
+            Tracker._active_tracker = self.outer
+        self._finalize(exc_type, exc_val, exc_tb)
+
+    def _finalize(self, exc_type, exc_val, exc_tb):
+        if self.track_gc:
+            gc.callbacks.remove(self._on_gc)
+            self._gc_action = None
         self.root.__exit__(exc_type, exc_val, exc_tb)
-        Tracker._active_tracker = None
+        self.current = None
+        self.outer = None
+        if self.dispatcher is not None:
+            self.dispatcher.close()
+
+    def _on_gc(self, phase: str, info: dict):
+        if get_ident() != self.thread or self.current is None:
+            return
+        if phase == "start":
+            self._gc_action = ActionNode(
+                self, self.current, "@gc", (), {"generation": info["generation"]}
+            )
+            self._gc_action.__enter__()
+        elif self._gc_action is not None:
+            action, self._gc_action = self._gc_action, None
+            if self.current is action:
+                action.kargs["collected"] = info["collected"]
+                action.kargs["uncollectable"] = info["uncollectable"]
+                action.__exit__(None, None, None)
 
     def is_active(self):
         """
@@ -53,37 +153,247 @@ class Tracker:
         """
         self.__enter__()
 
+    def start(self):
+        """
+        Starts the tracker without making it the active tracker, so it only
+        records the actions created through it, such as by hooks, while the
+        active tracker keeps recording the others.
+        """
+        assert not self.is_active(), "Tracker is already active"
+        self._start()
+
+    def finish(self):
+        """
+        Attempts to finish a tracker started with `start`. If the current node
+        is the root, the tracker is finalized.
+        """
+        assert Tracker._active_tracker is not self, "Tracker is the active one"
+        if self.current == self.root:
+            self._finalize(None, None, None)
+            return True
+
+        return False
+
     def try_deactivate(self):
         """
         Attempts to deactivate the tracker. If the current node is the root,
         the tracker is finalized.
         """
-        assert Tracker._active_tracker in (self, None)
-        Tracker._active_tracker = None
+        assert Tracker._active_tracker in (self, self.outer)
+        if Tracker._active_tracker is self:
+            Tracker._active_tracker = self.outer
 
         if self.current == self.root:
-            self.root.__exit__(None, None, None)
+            self._finalize(None, None, None)
             return True
 
         return False
 
-    def to_render(self, group_min_percent: float, use_calls_as_value: dict | None):
+    def add_listener(
+        self,
+        listener: Listener,
+        thresholds: "dict[str, float] | None" = None,
+        root_only: bool = False,
+    ):
+        """
+        Registers a listener notified when actions start and end, and when
+        events are recorded. Notifications are delivered in batches from a
+        background thread.
+
+        Args:
+            listener: The listener to notify.
+            thresholds: If set, only actions of these groups are notified, and
+                `on_end` only when they lasted at least the given milliseconds.
+            root_only: Whether to only notify direct children of the root.
+        """
+        if self.dispatcher is None:
+            self.dispatcher = Dispatcher()
+        self.dispatcher.register(listener, thresholds, root_only)
+        if self.is_active():
+            self.dispatcher.start()
+
+    def remove_listener(self, listener: Listener):
+        """
+        Unregisters a listener, delivering its pending notifications first.
+
+        Args:
+            listener: The listener to remove.
+        """
+        if self.dispatcher is None:
+            return
+        self.dispatcher.close()
+        self.dispatcher.unregister(listener)
+        if not self.dispatcher.registrations:
+            self.dispatcher = None
+        elif self.is_active():
+            self.dispatcher.start()
+
+    def prune(self, action: ActionNode) -> bool:
+        """
+        Folds a finished action into its parent's aggregate of the same group
+        if it is shorter than `min_length` or deeper than `max_depth`.
+
+        Args:
+            action: The action that just exited.
+
+        Returns:
+            Whether the action was folded.
+        """
+        parent = action.parent
+        if action is self.root or parent is None:
+            return False
+
+        if self.max_depth is not None:
+            depth, node = 1, parent
+            while node is not self.root and node.parent is not None:
+                depth, node = depth + 1, node.parent
+            folded = depth > self.max_depth
+        else:
+            folded = False
+
+        if folded or (
+            self._min_elapsed is not None and action.elapsed < self._min_elapsed
+        ):
+            if parent.children[-1] is action:
+                parent.children.pop()
+            else:
+                parent.children.remove(action)
+
+            self.aggregate(parent, action.group).fold(action)
+            return True
+        return False
+
+    def aggregate(self, parent: ActionNode, group: str) -> AggregateNode:
+        """
+        Gets the aggregate of a group under an action, creating it if needed.
+        The aggregates of an action are forgotten when it exits, so later calls
+        create new ones.
+
+        Args:
+            parent: The action holding the aggregate.
+            group: The group of the aggregated actions.
+
+        Returns:
+            The AggregateNode of the group.
+        """
+        siblings = self._aggregates.setdefault(parent, {})
+        aggregate = siblings.get(group)
+        if aggregate is None:
+            aggregate = siblings[group] = AggregateNode(self, parent, group)
+        return aggregate
+
+    def restricted(self, actions: "list[ActionNode]") -> "Tracker":
+        """
+        Creates a finished tracker holding only some actions, with their
+        subtrees and their ancestors, to render them apart from the rest.
+
+        Ancestors are copied and only last as long as the kept actions under
+        them, while the kept actions are shared with this tracker.
+
+        Args:
+            actions: The actions to keep, such as the results of an index query.
+
+        Returns:
+            A tracker that can be rendered like this one.
+        """
+        kept = set(actions)
+        tracker = Tracker(clock=self.clock, name=self.root.group)
+        copies: "dict[ActionNode, ActionNode]" = {self.root: tracker.root}
+        tracker.root.start = self.root.start
+
+        for action in sorted(kept, key=lambda action: action.start):
+            ancestors = []
+            node = action
+            while node is not self.root:
+                node = node.parent
+                if node is None or node in kept:
+                    break  # Outside of this tracker, or in a kept subtree
+                ancestors.append(node)
+            else:
+                copy = tracker.root
+                for ancestor in reversed(ancestors[:-1]):
+                    if ancestor not in copies:
+                        copies[ancestor] = ActionNode(
+                            tracker, copy, ancestor.group, ancestor.args, ancestor.kargs
+                        )
+                        copies[ancestor].start = ancestor.start
+                        copies[ancestor].result = ancestor.result
+                    copy = copies[ancestor]
+                if action is self.root:
+                    copy.children.extend(action.children)
+                else:
+                    copy.children.append(action)
+                while copy is not None:
+                    copy.elapsed += action.elapsed
+                    copy = copy.parent
+
+        for copy in copies.values():
+            copy.end = copy.start + copy.elapsed
+        return tracker
+
+    def to_render(
+        self,
+        group_min_percent: float,
+        use_calls_as_value: dict | None,
+        merge_siblings: bool = False,
+    ):
         """
         Converts the tracked actions into a RenderNode for visualization.
 
         Args:
             group_min_percent: Minimum percentage of total time to group actions.
             use_calls_as_value: Whether to use call counts as values.
+            merge_siblings: Whether to merge all siblings of the same group.
+
+        Renders of finished actions are kept between calls with the same options,
+        so only the subtrees recorded since the last call are rendered again.
+        While the root runs, the time grouping actions is rounded down to a
+        power of two, so it only changes, dropping the kept renders, when the
+        length of the root doubles.
 
         Returns:
             A RenderNode representation of the tracked actions.
         """
-        return RenderNode.from_action(
-            self.root, group_min_percent * self.root.length, use_calls_as_value
+        from flametracker.rendering import RenderNode
+
+        group_min_time = self._group_min_time(group_min_percent)
+        if use_calls_as_value:
+            # Nothing is grouped, so renders stay valid while the root grows
+            group_min_percent = group_min_time = 0.0
+        key = (
+            group_min_percent,
+            merge_siblings,
+            None
+            if use_calls_as_value is None
+            else tuple(sorted(use_calls_as_value.items())),
+        )
+
+        previous_time, previous = self._renders.get(key, (group_min_time, {}))
+        if previous_time != group_min_time:
+            previous = {}
+        renders: "dict[ActionNode, RenderNode]" = {}
+
+        render = RenderNode.from_action(
+            self.root,
+            group_min_time,
+            use_calls_as_value,
+            (previous, renders),
+            merge_siblings,
         )
+        self._renders[key] = (group_min_time, renders)
+        return render
+
+    def _group_min_time(self, group_min_percent: float) -> float:
+        group_min_time = group_min_percent * self.root.length
+        if self.root.end == 0 and group_min_time > 0:
+            group_min_time = ldexp(0.5, frexp(group_min_time)[1])
+        return group_min_time
 
     def to_dict(
-        self, group_min_percent: float = 0.01, use_calls_as_value: dict | None = None
+        self,
+        group_min_percent: float = 0.01,
+        use_calls_as_value: dict | None = None,
+        merge_siblings: bool = False,
     ):
         """
         Converts the tracked actions into a dictionary representation.
@@ -91,30 +401,120 @@ class Tracker:
         Args:
             group_min_percent: Minimum percentage of total time to group actions.
             use_calls_as_value: Whether to use call counts as values.
+            merge_siblings: Whether to merge all siblings of the same group.
 
         Returns:
             A dictionary representation of the tracked actions.
         """
-        return self.to_render(group_min_percent, use_calls_as_value).to_dict()
+        return self.to_render(
+            group_min_percent, use_calls_as_value, merge_siblings
+        ).to_dict()
 
-    def to_str(self, group_min_percent: float = 0.1, ignore_args: bool = False):
+    def to_str(
+        self,
+        group_min_percent: float = 0.1,
+        ignore_args: bool = False,
+        merge_siblings: bool = False,
+    ):
         """
         Converts the tracked actions into a string representation.
 
         Args:
             group_min_percent: Minimum percentage of total time to group actions.
             ignore_args: Whether to ignore arguments in the output.
+            merge_siblings: Whether to merge all siblings of the same group.
 
         Returns:
             A string representation of the tracked actions.
         """
-        return self.to_render(group_min_percent, {}).to_str(ignore_args)
+        return self.to_render(group_min_percent, {}, merge_siblings).to_str(
+            ignore_args
+        )
+
+    def to_folded(self, merge_siblings: bool = False):
+        """
+        Converts the tracked actions into the folded stacks format, with one
+        line per path of groups and its self time in microseconds.
+
+        Args:
+            merge_siblings: Whether to merge all siblings of the same group.
+
+        Returns:
+            A string in the folded stacks format.
+        """
+        return self.to_render(0, None, merge_siblings).to_folded()
+
+    def to_trace(self) -> dict:
+        """
+        Converts the tracked actions into the Trace Event Format, which can be
+        loaded in trace viewers such as Perfetto. Running actions last until now.
+
+        Returns:
+            A dictionary with the trace events, timestamps in microseconds.
+        """
+        origin = self.root.start
+        now = self.clock()
+        pid = getpid()
+        events = []
+
+        def span(action: ActionNode, cursor: int) -> "tuple[int, int]":
+            # Aggregates and events are placed after their previous sibling
+            start = cursor if action.start == -1 else action.start
+            if isinstance(action, AggregateNode):
+                return cursor, action.elapsed
+            if action.start == -1:
+                return start, 0
+            return start, action.elapsed if action.end else now - start
+
+        stack: "list[tuple[ActionNode, int]]" = [(self.root, origin)]
+        while stack:
+            action, cursor = stack.pop()
+            start, elapsed = span(action, cursor)
+            event = {
+                "name": action.group,
+                "ph": "X",
+                "ts": (start - origin) / 1000,
+                "dur": elapsed / 1000,
+                "pid": pid,
+                "tid": 0,
+            }
+            if action.start == -1:
+                del event["dur"]
+                event.update(ph="i", s="t")
+            if action.args or action.kargs:
+                event["args"] = {
+                    "args": ", ".join(
+                        [repr(arg) for arg in action.args]
+                        + [
+                            f"{key}={repr(value)}"
+                            for key, value in action.kargs.items()
+                        ]
+                    )
+                }
+            if isinstance(action, AggregateNode):
+                event.setdefault("args", {})["count"] = action.count
+            events.append(event)
+
+            children = []
+            for child in action.children:
+                children.append((child, start))
+                child_start, child_elapsed = span(child, start)
+                start = child_start + child_elapsed
+            stack.extend(reversed(children))
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
 
     def to_flamegraph(
         self,
         group_min_percent: float = 0.01,
         splited=False,
         use_calls_as_value: dict | None = None,
+        offline: bool = False,
+        compact: bool = False,
+        compress: bool = False,
+        lod: int | None = None,
+        merge_siblings: bool = False,
+        workers: int | None = None,
     ):
         """
         Converts the tracked actions into a flamegraph HTML representation.
@@ -123,13 +523,35 @@ class Tracker:
             group_min_percent: Minimum percentage of total time to group actions.
             splited: Whether to split the flamegraph by root children.
             use_calls_as_value: Whether to use call counts as values.
+            offline: Whether to inline the viewer instead of loading d3 from a CDN.
+            compact: Whether to embed a string-tabled, columnar payload.
+            compress: Whether to gzip and base64 encode the payload (implies compact).
+            lod: If set, the maximum number of nodes per chunk. Deeper subtrees are
+                stored as chunks loaded lazily when zooming in (implies offline).
+            merge_siblings: Whether to merge all siblings of the same group.
+            workers: If set with `splited`, the number of processes building and
+                encoding the graphs of the root children in parallel.
 
         Returns:
             A string containing the flamegraph HTML.
         """
-        return self.to_render(group_min_percent, use_calls_as_value).to_flamegraph(
-            splited,
-        )
+        if splited and workers:
+            from flametracker.rendering import RenderNode
+
+            return RenderNode.split_flamegraph(
+                self.root,
+                self._group_min_time(group_min_percent),
+                use_calls_as_value,
+                merge_siblings,
+                workers,
+                offline,
+                compact,
+                compress,
+                lod,
+            )
+        return self.to_render(
+            group_min_percent, use_calls_as_value, merge_siblings
+        ).to_flamegraph(splited, offline, compact, compress, lod)
 
     def action(self, name: str, *args, **kargs):
         """
@@ -158,7 +580,10 @@ class Tracker:
         Returns:
             An ActionNode instance representing the event.
         """
-        return ActionNode.as_event(self, self.current, name, args, kargs, result)
+        event = ActionNode.as_event(self, self.current, name, args, kargs, result)
+        if self.dispatcher is not None:
+            self.dispatcher.evented(event)
+        return event
 
 
 def action(name: str, *args, **kargs):
@@ -206,38 +631,283 @@ def event(name: str, *args, result=None, **kargs):
     )
 
 
-def wrap(fn: F) -> F:
+def wrap(
+    fn: "F | None" = None, *, per_resume: bool = False, iterators: bool = False
+):
     """
     Wraps a function to automatically track its execution within the active tracker.
 
+    Generators are tracked while they run rather than when they are created:
+    generator functions, and generators returned by other functions, record
+    the time spent inside them across all their resumes.
+
     Args:
-        fn: The function to wrap.
+        fn: The function to wrap. If omitted, returns a decorator.
+        per_resume: Whether to record each resume of a generator as its own
+            action, instead of one aggregate holding the total time and the
+            number of resumes.
+        iterators: Whether to also track the other iterators returned by the
+            function, which are then replaced by a generator.
 
     Returns:
         The wrapped function.
     """
+    if fn is None:
+        return lambda fn: wrap(fn, per_resume=per_resume, iterators=iterators)
     if not __debug__:
         return fn
 
+    name = fn.__qualname__
+
+    if getattr(getattr(fn, "__code__", None), "co_flags", 0) & _CO_GENERATOR:
+
+        @wraps(fn)
+        def generate(*args, **kargs):
+            generator = fn(*args, **kargs)
+            return (yield from track_resumes(generator, name, args, kargs, per_resume))
+
+        return cast(F, generate)
+
     @wraps(fn)
     def call(*args, **kargs):
         tracker = Tracker._active_tracker
         if tracker:
-            with tracker.action(fn.__qualname__, *args, **kargs) as action:
+            with tracker.action(name, *args, **kargs) as action:
                 result = fn(*args, **kargs)
                 action.set_result(result)
-                return result
         else:
-            return fn(*args, **kargs)
+            result = fn(*args, **kargs)
+
+        if isinstance(result, GeneratorType) or (
+            iterators and isinstance(result, Iterator)
+        ):
+            return track_resumes(iter(result), name, args, kargs, per_resume)
+        return result
 
     return cast(F, call)
 
+
+def track_resumes(
+    iterator: Iterator, name: str, args: tuple, kargs: dict, per_resume: bool
+):
+    """
+    Delegates to an iterator or generator, tracking the time spent in each of
+    its resumes within the tracker active when it is resumed.
+
+    Unless `per_resume` is set, the resumes are recorded in an AggregateNode
+    attached under the action resuming it, whose count is the number of
+    resumes and whose result is the returned value. Actions left open by the
+    iterator when it yields stay under the aggregate, without counting the
+    time it is suspended. Resuming it under another action ends the aggregate
+    and starts a new one there, where the open actions continue.
+
+    With `per_resume`, the actions left open when it yields end there, and
+    continue as new actions under the action of the next resume.
+
+    Args:
+        iterator: The iterator to delegate to.
+        name: The group of the recorded actions.
+        args: Positional arguments recorded with the actions.
+        kargs: Keyword arguments recorded with the actions.
+        per_resume: Whether to record each resume as its own action.
+
+    Returns:
+        A generator yielding the same values.
+    """
+    node: "AggregateNode | None" = None
+    last_end = 0
+    opened: "list[ActionNode]" = []
+
+    def resume(method, value):
+        nonlocal node, last_end, opened
+        if node is not None:
+            tracker = node.tracker
+        elif opened:
+            tracker = opened[0].tracker
+        else:
+            tracker = Tracker._active_tracker
+        if tracker is None or tracker.current is None:
+            return method(value)
+
+        if per_resume:
+            with tracker.action(name, *args, **kargs) as action:
+                _continue_actions(opened)
+                try:
+                    return method(value)
+                except StopIteration as stop:
+                    action.set_result(stop.value)
+                    raise
+                finally:
+                    opened = _end_actions(tracker, action)
+
+        start = tracker.clock()
+        if node is not None and node.parent is not tracker.current:
+            # Resumed under another action, which gets its own aggregate so
+            # each one stays within its parent
+            node.end = last_end
+            tracker._aggregates.pop(node, None)
+            if tracker.dispatcher is not None:
+                tracker.dispatcher.ended(node)
+            _split_actions(tracker, node, opened, last_end)
+            node = None
+
+        if node is None:
+            node = AggregateNode(tracker, tracker.current, name)
+            node.args, node.kargs = args, kargs
+            node.calls[name] += 1
+            if tracker.dispatcher is not None:
+                tracker.dispatcher.started(node)
+
+        outer, tracker.current = tracker.current, node
+        if not node.count:
+            node.start = start
+            _continue_actions(opened)
+        elif opened:
+            # Actions left open by the iterator when it yields are restored
+            # with it, without the time it was suspended
+            for action in opened:
+                action.start += start - last_end
+            tracker.current = opened[-1]
+        finished = False
+        try:
+            return method(value)
+        except StopIteration as stop:
+            node.result = stop.value
+            finished = True
+            raise
+        except BaseException:
+            finished = True
+            raise
+        finally:
+            opened = _open_actions(tracker, node)
+            end = last_end = tracker.clock()
+            node.count += 1
+            node.elapsed += end - start
+            tracker.current = outer
+            if finished:
+                node.end = end
+                tracker._aggregates.pop(node, None)
+                if tracker.dispatcher is not None:
+                    tracker.dispatcher.ended(node)
+
+    send = getattr(iterator, "send", None) or (lambda value: next(iterator))
+    value, error = None, None
+    while True:
+        try:
+            if error is None:
+                item = resume(send, value)
+            else:
+                item = resume(iterator.throw, error)  # type: ignore
+        except StopIteration as stop:
+            return stop.value
+        value, error = None, None
+        try:
+            value = yield item
+        except GeneratorExit:
+            close = getattr(iterator, "close", None)
+            if close is not None:
+                if opened:
+                    # The actions left open are exited while closing
+                    resume(lambda value: close(), None)
+                else:
+                    close()
+            raise
+        except BaseException as exception:
+            if not hasattr(iterator, "throw"):
+                raise
+            error = exception
+
+
+def _open_actions(tracker: Tracker, owner: ActionNode) -> "list[ActionNode]":
+    """
+    Lists the actions left open under an action, outermost first.
+    """
+    opened = []
+    action = tracker.current
+    while action is not owner and action is not None:
+        opened.append(action)
+        action = action.parent
+    opened.reverse()
+    return opened
+
+
+def _split_action(tracker: Tracker, action: ActionNode) -> ActionNode:
+    """
+    Replaces an open action with a copy holding its children, so the copy
+    can be ended while the action continues elsewhere.
+    """
+    parent = cast(ActionNode, action.parent)
+    copy = ActionNode(tracker, None, action.group, action.args, action.kargs)
+    copy.parent, copy.start = parent, action.start
+    copy.children, action.children = action.children, []
+    for child in copy.children:
+        child.parent = copy
+    position = len(parent.children) - 1
+    while parent.children[position] is not action:
+        position -= 1
+    parent.children[position] = copy
+    tracker._aggregates.pop(action, None)
+    return copy
+
+
+def _end_actions(tracker: Tracker, owner: ActionNode) -> "list[ActionNode]":
+    """
+    Ends the actions left open under an action by exiting copies of them,
+    innermost first.
+
+    Returns:
+        The open actions, outermost first, to continue with `_continue_actions`.
+    """
+    opened = _open_actions(tracker, owner)
+    for action in reversed(opened):
+        tracker.current = _split_action(tracker, action)
+        tracker.current.__exit__(None, None, None)
+    return opened
+
+
+def _split_actions(
+    tracker: Tracker, owner: ActionNode, opened: "list[ActionNode]", end: int
+):
+    """
+    Ends the actions left open under a finished action at the time it ended,
+    forgetting the renders kept for its ancestors as their subtrees change.
+    """
+    for action in reversed(opened):
+        copy = _split_action(tracker, action)
+        copy.end, copy.elapsed = end, end - action.start
+        if tracker.dispatcher is not None:
+            tracker.dispatcher.ended(copy)
+    ancestor = owner.parent
+    while ancestor is not None:
+        for _, renders in tracker._renders.values():
+            renders.pop(ancestor, None)
+        ancestor = ancestor.parent
+
+
+def _continue_actions(opened: "list[ActionNode]"):
+    """
+    Starts again the actions ended by `_end_actions` or `_split_actions`,
+    under the current action of their tracker.
+    """
+    for action in opened:
+        action.parent = action.tracker.current
+        action.parent.children.append(action)  # type: ignore
+        action.start = 0
+        action.__enter__()
+
+
 @contextmanager
 def file_flamegraph(
     source_file: str,
     group_min_percent: float = 0.01,
     splited: bool = False,
     use_calls_as_value: None | dict = None,
+    offline: bool = False,
+    compact: bool = False,
+    compress: bool = False,
+    lod: int | None = None,
+    merge_siblings: bool = False,
+    workers: int | None = None,
 ):
     """
     Context manager for generating a flamegraph HTML file while tracking function execution.
@@ -251,6 +921,12 @@ def file_flamegraph(
         group_min_percent (float, optional): Minimum percentage of total time to group actions. Defaults to 0.01.
         splited (bool, optional): Whether to split the flamegraph by root children. Defaults to False.
         use_calls_as_value (None | dict, optional): Whether to use call counts as values or provide a mapping. Defaults to False.
+        offline (bool, optional): Whether to inline the viewer instead of loading d3 from a CDN. Defaults to False.
+        compact (bool, optional): Whether to embed a string-tabled, columnar payload. Defaults to False.
+        compress (bool, optional): Whether to gzip and base64 encode the payload. Defaults to False.
+        lod (int | None, optional): Maximum number of nodes per lazily loaded chunk. Defaults to None.
+        merge_siblings (bool, optional): Whether to merge all siblings of the same group. Defaults to False.
+        workers (int | None, optional): Number of processes rendering split graphs in parallel. Defaults to None.
 
     Yields:
         Tracker: An instance of the `Tracker` class to monitor actions and events.
@@ -292,7 +968,17 @@ def file_flamegraph(
   </body>
 </html>""")
             f.flush()
-            flamegaprh = tracker.to_flamegraph(group_min_percent, splited, use_calls_as_value)
+            flamegaprh = tracker.to_flamegraph(
+                group_min_percent,
+                splited,
+                use_calls_as_value,
+                offline,
+                compact,
+                compress,
+                lod,
+                merge_siblings,
+                workers,
+            )
             f.seek(0)
             f.truncate()
             f.write(flamegaprh)
@@ -0,0 +1,504 @@
+from base64 import b64decode, b64encode
+from gzip import compress as gzip_compress
+from gzip import decompress as gzip_decompress
+from heapq import heappop, heappush
+from json import dumps, loads
+
+from flametracker.tracking import ActionNode, AggregateNode
+from flametracker.types import RenderNode
+
+GZIP_PREFIX = "gz:"
+
+
+def encode_tree(roots: "list[dict]", cuts: "dict[int, int] | None" = None) -> dict:
+    """
+    Encodes rendered nodes into a string-tabled, columnar payload.
+
+    Nodes are stored in preorder with their child count, so the nesting can be
+    rebuilt without repeating any key. Names and call counters are deduplicated
+    through shared tables.
+
+    Args:
+        roots: Rendered nodes as returned by `RenderNode.to_dict`.
+        cuts: Maps the id of nodes whose children are stored in another chunk
+            to that chunk's index.
+
+    Returns:
+        A dictionary of flat columns describing the forest.
+    """
+    strings: "list[str]" = []
+    string_ids: "dict[str, int]" = {}
+    tables: "list[list[int]]" = []
+    table_ids: "dict[tuple, int]" = {}
+
+    def intern(string: str) -> int:
+        index = string_ids.get(string)
+        if index is None:
+            index = string_ids[string] = len(strings)
+            strings.append(string)
+        return index
+
+    names: "list[int]" = []
+    lengths: "list[float]" = []
+    values: "list[float]" = []
+    sizes: "list[int]" = []
+    calls: "list[int]" = []
+    chunks: "list[int]" = []
+
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        children = node["children"]
+        chunk = cuts.get(id(node), -1) if cuts else -1
+        if chunk != -1:
+            children = []
+        chunks.append(chunk)
+
+        table = tuple(
+            item
+            for group, count in node["calls"].items()
+            for item in (intern(group), count)
+        )
+        table_id = table_ids.get(table)
+        if table_id is None:
+            table_id = table_ids[table] = len(tables)
+            tables.append(list(table))
+
+        names.append(intern(node["name"]))
+        lengths.append(float(node["length"]))
+        values.append(node["value"])
+        sizes.append(len(children))
+        calls.append(table_id)
+        stack.extend(reversed(children))
+
+    payload = {
+        "s": strings,
+        "n": names,
+        "l": lengths,
+        "v": values,
+        "d": sizes,
+        "c": calls,
+        "t": tables,
+    }
+    if cuts is not None:
+        payload["x"] = chunks
+    return payload
+
+
+def split_tree(
+    roots: "list[dict]", budget: int
+) -> "list[tuple[list[dict], dict, int]]":
+    """
+    Splits a forest into chunks of at most `budget` nodes for lazy loading.
+
+    Each chunk greedily expands its most valuable nodes first, so the first
+    chunk is a pruned overview of the whole tree. Nodes whose children did not
+    fit get their children moved, as a forest, into a later chunk, spread over
+    consecutive chunks when there are more than `budget` of them. Nodes of
+    equal value are expanded in the order they are reached, so the chunks do
+    not depend on memory addresses.
+
+    Args:
+        roots: Rendered nodes as returned by `RenderNode.to_dict`.
+        budget: The maximum number of nodes per chunk.
+
+    Returns:
+        A list of `(roots, cuts, following)` triples, the first one being the
+        overview. `following` is the index of the chunk holding the rest of
+        the forest, or -1.
+    """
+    budget = max(budget, 1)
+    chunks: "list[tuple[list[dict], dict, int]]" = []
+    pending = [(roots, -1)]
+
+    while len(chunks) < len(pending):
+        forest, following = pending[len(chunks)]
+        cuts: "dict[int, int]" = {}
+        chunks.append((forest, cuts, following))
+
+        count = len(forest)
+        order = 0
+        heap: "list[tuple[float, int, dict]]" = []
+        for node in forest:
+            if node["children"]:
+                heappush(heap, (-node["value"], order, node))
+                order += 1
+
+        frontier = []
+        while heap:
+            node = heappop(heap)[2]
+            children = node["children"]
+            if count + len(children) > budget:
+                frontier.append(node)
+                continue
+            count += len(children)
+            for child in children:
+                if child["children"]:
+                    heappush(heap, (-child["value"], order, child))
+                    order += 1
+
+        for node in frontier:
+            cuts[id(node)] = len(pending)
+            children = node["children"]
+            for position in range(0, len(children), budget):
+                following = len(pending) + 1
+                if position + budget >= len(children):
+                    following = -1
+                pending.append((children[position : position + budget], following))
+
+    return chunks
+
+
+def decode_tree(payload: dict) -> "list[dict]":
+    """
+    Rebuilds nested nodes from a payload produced by `encode_tree`.
+
+    Args:
+        payload: The columnar payload.
+
+    Returns:
+        The list of root nodes, in the same shape as `RenderNode.to_dict`.
+    """
+    strings = payload["s"]
+    tables = [
+        {strings[table[i]]: table[i + 1] for i in range(0, len(table), 2)}
+        for table in payload["t"]
+    ]
+
+    chunks = payload.get("x")
+
+    roots: "list[dict]" = []
+    stack: "list[list]" = []
+    for i, size in enumerate(payload["d"]):
+        node = {
+            "name": strings[payload["n"][i]],
+            "length": payload["l"][i],
+            "value": payload["v"][i],
+            "calls": dict(tables[payload["c"][i]]),
+            "children": [],
+        }
+        if chunks and chunks[i] != -1:
+            node["chunk"] = chunks[i]
+
+        if stack:
+            top = stack[-1]
+            top[0]["children"].append(node)
+            top[1] -= 1
+            if top[1] == 0:
+                stack.pop()
+        else:
+            roots.append(node)
+
+        if size:
+            stack.append([node, size])
+
+    return roots
+
+
+def encode_aggregates(roots: "list[RenderNode]") -> dict:
+    """
+    Encodes merged renders into a columnar payload of aggregated actions.
+
+    Unlike `encode_tree`, only groups are kept and each node stores its own
+    calls, which are the calls of its subtree not covered by its children.
+
+    Args:
+        roots: Renders built with `merge_siblings`.
+
+    Returns:
+        A dictionary of flat columns describing the forest.
+    """
+    strings: "list[str]" = []
+    string_ids: "dict[str, int]" = {}
+    tables: "list[list[int]]" = []
+    table_ids: "dict[tuple, int]" = {}
+
+    def intern(string: str) -> int:
+        index = string_ids.get(string)
+        if index is None:
+            index = string_ids[string] = len(strings)
+            strings.append(string)
+        return index
+
+    groups: "list[int]" = []
+    elapsed: "list[int]" = []
+    counts: "list[int]" = []
+    sizes: "list[int]" = []
+    calls: "list[int]" = []
+
+    stack = list(reversed(roots))
+    while stack:
+        node = stack.pop()
+        own_calls = node.calls.copy()
+        for child in node.children:
+            own_calls.subtract(child.calls)
+
+        table = tuple(
+            item
+            for group, count in own_calls.items()
+            if count
+            for item in (intern(group), count)
+        )
+        table_id = table_ids.get(table)
+        if table_id is None:
+            table_id = table_ids[table] = len(tables)
+            tables.append(list(table))
+
+        groups.append(intern(node.group))
+        elapsed.append(node.elapsed)
+        counts.append(node.group_size)
+        sizes.append(len(node.children))
+        calls.append(table_id)
+        stack.extend(reversed(node.children))
+
+    return {
+        "s": strings,
+        "g": groups,
+        "e": elapsed,
+        "k": counts,
+        "d": sizes,
+        "c": calls,
+        "t": tables,
+    }
+
+
+def decode_aggregates(payload: dict) -> "list[AggregateNode]":
+    """
+    Rebuilds aggregated actions from a payload produced by `encode_aggregates`.
+
+    Args:
+        payload: The columnar payload.
+
+    Returns:
+        The list of root aggregates, detached from any tracker.
+    """
+    strings = payload["s"]
+    tables = [
+        [(strings[table[i]], table[i + 1]) for i in range(0, len(table), 2)]
+        for table in payload["t"]
+    ]
+
+    roots: "list[AggregateNode]" = []
+    stack: "list[list]" = []
+    for i, size in enumerate(payload["d"]):
+        parent = stack[-1][0] if stack else None
+        node = AggregateNode(None, parent, strings[payload["g"][i]])  # type: ignore
+        node.count = payload["k"][i]
+        node.elapsed = payload["e"][i]
+        node.calls.update(dict(tables[payload["c"][i]]))
+
+        if stack:
+            stack[-1][1] -= 1
+            if stack[-1][1] == 0:
+                stack.pop()
+        else:
+            roots.append(node)
+
+        if size:
+            stack.append([node, size])
+
+    return roots
+
+
+class Verbatim(str):
+    """
+    A string whose `repr` is itself, standing for an already formatted value.
+    """
+
+    def __repr__(self):
+        return str(self)
+
+
+def encode_actions(roots: "list[ActionNode]") -> dict:
+    """
+    Encodes recorded actions into a columnar payload that can be sent to
+    another process. Arguments and results are formatted beforehand.
+
+    Args:
+        roots: The actions to encode, with their subtrees.
+
+    Returns:
+        A dictionary of flat columns describing the forest.
+    """
+    strings: "list[str]" = []
+    string_ids: "dict[str, int]" = {}
+    tables: "list[list[int]]" = []
+
+    def intern(string: str) -> int:
+        index = string_ids.get(string)
+        if index is None:
+            index = string_ids[string] = len(strings)
+            strings.append(string)
+        return index
+
+    groups: "list[int]" = []
+    args: "list[int]" = []
+    results: "list[int]" = []
+    elapsed: "list[int]" = []
+    counts: "list[int]" = []
+    sizes: "list[int]" = []
+    calls: "list[int]" = []
+
+    stack = list(reversed(roots))
+    while stack:
+        action = stack.pop()
+        groups.append(intern(action.group))
+        args.append(
+            intern(
+                ", ".join(
+                    [repr(arg) for arg in action.args]
+                    + [f"{key}={repr(value)}" for key, value in action.kargs.items()]
+                )
+            )
+        )
+        results.append(intern(repr(action.result)))
+        elapsed.append(action.elapsed)
+        sizes.append(len(action.children))
+
+        if isinstance(action, AggregateNode):
+            counts.append(action.count)
+            calls.append(len(tables))
+            tables.append(
+                [
+                    item
+                    for group, count in action.calls.items()
+                    for item in (intern(group), count)
+                ]
+            )
+        else:
+            counts.append(0)
+            calls.append(-1)
+
+        stack.extend(reversed(action.children))
+
+    return {
+        "s": strings,
+        "g": groups,
+        "a": args,
+        "r": results,
+        "e": elapsed,
+        "k": counts,
+        "d": sizes,
+        "c": calls,
+        "t": tables,
+    }
+
+
+def decode_actions(payload: dict) -> "list[ActionNode]":
+    """
+    Rebuilds actions from a payload produced by `encode_actions`. Arguments and
+    results are `Verbatim` strings rendering as they were formatted.
+
+    Args:
+        payload: The columnar payload.
+
+    Returns:
+        The list of root actions, detached from any tracker.
+    """
+    strings = payload["s"]
+    verbatims = [Verbatim(string) for string in strings]
+
+    roots: "list[ActionNode]" = []
+    stack: "list[list]" = []
+    for i, size in enumerate(payload["d"]):
+        parent = stack[-1][0] if stack else None
+        group = strings[payload["g"][i]]
+        table = payload["c"][i]
+        if table == -1:
+            args = verbatims[payload["a"][i]]
+            action = ActionNode(
+                None, parent, group, (args,) if args else (), {}  # type: ignore
+            )
+        else:
+            action = AggregateNode(None, parent, group)  # type: ignore
+            action.count = payload["k"][i]
+            items = payload["t"][table]
+            for j in range(0, len(items), 2):
+                action.calls[strings[items[j]]] = items[j + 1]
+        action.result = verbatims[payload["r"][i]]
+        action.start, action.end = 1, 1 + payload["e"][i]
+        action.elapsed = payload["e"][i]
+
+        if stack:
+            stack[-1][1] -= 1
+            if stack[-1][1] == 0:
+                stack.pop()
+        else:
+            roots.append(action)
+
+        if size:
+            stack.append([action, size])
+
+    return roots
+
+
+def pack(payload: dict, compress: bool) -> str:
+    """
+    Serializes a payload as a JavaScript literal for embedding in HTML.
+
+    Args:
+        payload: The payload to serialize.
+        compress: Whether to gzip and base64 encode the JSON text.
+
+    Returns:
+        A JSON object literal, or a JSON string literal when compressed.
+    """
+    text = dumps(payload, check_circular=False, separators=(",", ":"))
+    if compress:
+        data = gzip_compress(text.encode(), 9, mtime=0)
+        text = dumps(GZIP_PREFIX + b64encode(data).decode("ascii"))
+    return text.replace("</", "<\\/")
+
+
+def unpack(text: str):
+    """
+    Reverses `pack`.
+
+    Args:
+        text: The literal produced by `pack`.
+
+    Returns:
+        The deserialized payload.
+    """
+    value = loads(text)
+    if isinstance(value, str):
+        if value.startswith(GZIP_PREFIX):
+            value = gzip_decompress(b64decode(value[len(GZIP_PREFIX) :]))
+        value = loads(value)
+    return value
+
+
+def dump_graph(
+    graph: dict, compact: bool, compress: bool, lod: "int | None" = None
+) -> str:
+    """
+    Serializes a single flamegraph for embedding in the viewer's `data` array.
+
+    Args:
+        graph: The rendered root node of the graph.
+        compact: Whether to use the columnar payload instead of nested JSON.
+        compress: Whether to gzip the payload (implies `compact`).
+        lod: If set, the maximum number of nodes per lazily loaded chunk.
+
+    Returns:
+        A JavaScript literal describing the graph.
+    """
+    if lod:
+        (top, top_cuts, _), *chunks = split_tree([graph], lod)
+        deferred = []
+        for forest, cuts, following in chunks:
+            payload = encode_tree(forest, cuts)
+            if following != -1:
+                payload["m"] = following
+            text = pack(payload, compress)
+            deferred.append(text if compress else dumps(text))
+        return (
+            '{"lod":'
+            + pack(encode_tree(top, top_cuts), compress)
+            + ',"chunks":['
+            + ",".join(deferred)
+            + "]}"
+        )
+    if compact or compress:
+        return pack(encode_tree([graph]), compress)
+    return dumps(graph, check_circular=False, sort_keys=True).replace("</", "<\\/")
@@ -0,0 +1,332 @@
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import getpid
+from socket import AF_INET, AF_UNIX, SOCK_STREAM, gethostname, socket
+from socketserver import (
+    StreamRequestHandler,
+    ThreadingTCPServer,
+    ThreadingUnixStreamServer,
+)
+from struct import Struct
+from threading import Condition, Lock, Thread
+from time import monotonic, sleep
+from typing import Tuple, Union
+from zlib import compress, decompress
+
+from flametracker.encoding import decode_aggregates, encode_aggregates
+from flametracker.listeners import Listener
+from flametracker.rendering import RenderNode
+from flametracker.tracking import AggregateNode
+from flametracker.types import ActionNode
+
+Address = Union[str, Tuple[str, int]]
+
+FRAME_HEADER = Struct(">I")
+
+
+class _UnixServer(ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class _TCPServer(ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def parse_address(address: str) -> Address:
+    """
+    Parses a collector address given as `host:port` or as a Unix socket path.
+
+    Args:
+        address: The address to parse.
+
+    Returns:
+        A `(host, port)` tuple for TCP, or the socket path.
+    """
+    host, _, port = address.rpartition(":")
+    if host and port.isdigit():
+        return host, int(port)
+    return address
+
+
+def encode_frame(message: dict) -> bytes:
+    """
+    Encodes a message as a length-prefixed, zlib compressed JSON frame.
+
+    Args:
+        message: The message to encode.
+
+    Returns:
+        The frame bytes.
+    """
+    body = compress(dumps(message, separators=(",", ":")).encode())
+    return FRAME_HEADER.pack(len(body)) + body
+
+
+def read_frame(stream) -> "dict | None":
+    """
+    Reads a frame written by `encode_frame` from a binary stream.
+
+    Args:
+        stream: The stream to read from.
+
+    Returns:
+        The decoded message, or None at the end of the stream.
+    """
+    header = stream.read(FRAME_HEADER.size)
+    if len(header) < FRAME_HEADER.size:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    body = stream.read(size)
+    if len(body) < size:
+        return None
+    return loads(decompress(body))
+
+
+class Exporter(Listener):
+    """
+    Streams completed root-level subtrees of a tracker to a collector.
+
+    Subtrees are merged and encoded on a background thread, then sent in
+    batches. When the collector is slow or unreachable, subtrees are dropped
+    and counted instead of blocking the tracked code.
+
+    Example:
+        tracker.add_listener(Exporter("/tmp/flametracker.sock"), root_only=True)
+    """
+
+    def __init__(
+        self,
+        address: Address,
+        max_pending: int = 1024,
+        batch_size: int = 64,
+        interval: float = 1.0,
+        timeout: float = 1.0,
+    ):
+        """
+        Creates an exporter and starts its sending thread.
+
+        Args:
+            address: A Unix socket path, or a `(host, port)` tuple for TCP.
+            max_pending: Subtrees queued beyond this are dropped.
+            batch_size: Maximum number of subtrees per frame.
+            interval: Maximum delay in seconds before a partial batch is sent.
+            timeout: Socket timeout in seconds.
+        """
+        self.address = address
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.interval = interval
+        self.timeout = timeout
+        self.sent = 0
+        self.dropped = 0
+        self.failed = 0
+        self._pending: "list[ActionNode]" = []
+        self._condition = Condition(Lock())
+        self._closed = False
+        self._socket: "socket | None" = None
+        self._thread = Thread(target=self._run, name="flametracker-exporter")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def on_end(self, action: "ActionNode"):
+        if action.parent is not action.tracker.root:
+            return
+        with self._condition:
+            if len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return
+            self._pending.append(action)
+            if len(self._pending) >= self.batch_size:
+                self._condition.notify()
+
+    def close(self):
+        """
+        Sends the pending subtrees and stops the sending thread.
+        """
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = monotonic() + self.interval
+                while (
+                    not self._closed
+                    and len(self._pending) < self.batch_size
+                    and monotonic() < deadline
+                ):
+                    self._condition.wait(deadline - monotonic())
+                batch = self._pending[: self.batch_size]
+                del self._pending[: self.batch_size]
+                closed = self._closed and not self._pending
+
+            if batch:
+                self._send(batch)
+            if closed:
+                if self._socket is not None:
+                    self._socket.close()
+                return
+
+    def _send(self, batch: "list[ActionNode]"):
+        renders = [
+            RenderNode.from_action(action, 0, None, None, True) for action in batch
+        ]
+        frame = encode_frame(
+            {
+                "host": gethostname(),
+                "pid": getpid(),
+                "dropped": self.dropped,
+                "trees": encode_aggregates(renders),
+            }
+        )
+        try:
+            if self._socket is None:
+                family = AF_UNIX if isinstance(self.address, str) else AF_INET
+                self._socket = socket(family, SOCK_STREAM)
+                self._socket.settimeout(self.timeout)
+                self._socket.connect(self.address)
+            self._socket.sendall(frame)
+            self.sent += len(batch)
+        except OSError:
+            self.failed += len(batch)
+            if self._socket is not None:
+                self._socket.close()
+                self._socket = None
+
+
+class Collector:
+    """
+    Receives subtrees from exporters and merges them by path into a single
+    aggregated tree, which can be rendered like a tracker's recording.
+    """
+
+    def __init__(self, address: Address):
+        """
+        Creates a collector and binds its socket.
+
+        Args:
+            address: A Unix socket path, or a `(host, port)` tuple for TCP.
+        """
+        self.root = AggregateNode(None, None, "@root")  # type: ignore
+        self.root.count = 1
+        self.root.calls[self.root.group] = 1
+        self.sources: "dict[tuple[str, int], int]" = {}
+        self.frames = 0
+        self._children: "dict[AggregateNode, dict[str, AggregateNode]]" = {}
+        self._lock = Lock()
+
+        collector = self
+
+        class Handler(StreamRequestHandler):
+            def handle(self):
+                while True:
+                    message = read_frame(self.rfile)
+                    if message is None:
+                        return
+                    collector.merge(message)
+
+        server_class = _UnixServer if isinstance(address, str) else _TCPServer
+        self.server = server_class(address, Handler)  # type: ignore
+
+    def serve_forever(self):
+        """
+        Accepts exporters until `shutdown` is called.
+        """
+        self.server.serve_forever()
+
+    def shutdown(self):
+        """
+        Stops serving and closes the socket.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def merge(self, message: dict):
+        """
+        Merges a message sent by an exporter into the aggregated tree.
+
+        Args:
+            message: The decoded frame.
+        """
+        trees = decode_aggregates(message["trees"])
+        with self._lock:
+            self.frames += 1
+            self.sources[(message["host"], message["pid"])] = message["dropped"]
+            for tree in trees:
+                self.root.elapsed += tree.elapsed
+                self._merge_into(self.root, tree)
+
+    def _merge_into(self, parent: AggregateNode, node: AggregateNode):
+        children = self._children.get(parent)
+        if children is None:
+            children = self._children[parent] = {
+                child.group: child for child in parent.children
+            }
+
+        existing = children.get(node.group)
+        if existing is None:
+            node.parent = parent
+            parent.children.append(node)
+            children[node.group] = node
+            return
+
+        existing.count += node.count
+        existing.elapsed += node.elapsed
+        existing.calls.update(node.calls)
+        for child in node.children:
+            self._merge_into(existing, child)  # type: ignore
+
+    def to_render(self) -> RenderNode:
+        """
+        Converts the aggregated tree into a RenderNode for visualization.
+
+        Returns:
+            A RenderNode representation of the aggregated tree.
+        """
+        with self._lock:
+            return RenderNode.from_action(self.root, 0, None, None, True)
+
+    def write_flamegraph(self, path: str, **kargs):
+        """
+        Writes the aggregated tree as a flamegraph HTML file.
+
+        Args:
+            path: The output file.
+            **kargs: Options forwarded to `RenderNode.to_flamegraph`.
+        """
+        flamegraph = self.to_render().to_flamegraph(False, **kargs)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(flamegraph)
+
+
+def main(argv: "list[str] | None" = None):
+    """
+    Runs a reference collector, writing an aggregated flamegraph periodically.
+    """
+    parser = ArgumentParser(
+        prog="python -m flametracker.export",
+        description="Collects subtrees streamed by flametracker exporters.",
+    )
+    parser.add_argument("address", help="Unix socket path or host:port to listen on")
+    parser.add_argument("output", help="Flamegraph HTML file to write")
+    parser.add_argument(
+        "--interval", type=float, default=10.0, help="Seconds between two writes"
+    )
+    args = parser.parse_args(argv)
+
+    collector = Collector(parse_address(args.address))
+    Thread(target=collector.serve_forever, daemon=True).start()
+    try:
+        while True:
+            sleep(args.interval)
+            collector.write_flamegraph(args.output, offline=True, compress=True)
+    except KeyboardInterrupt:
+        collector.shutdown()
+        collector.write_flamegraph(args.output, offline=True, compress=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+import atexit
+import sys
+from importlib.abc import MetaPathFinder
+from os import environ
+from threading import get_ident
+
+from flametracker.core import Tracker
+from flametracker.tracking import ActionNode
+
+ENVIRONMENT_VARIABLE = "FLAMETRACKER_IMPORTS"
+"""When set, importing flametracker profiles the imports and writes them there."""
+
+
+class _TimedLoader:
+    """
+    Wraps the loader of a module to record its import while it is created and
+    executed, starting at the lookup of its spec when nothing happened since.
+    """
+
+    def __init__(self, spec, tracker: Tracker, parent: ActionNode, start: int):
+        self._spec = spec
+        self._loader = spec.loader
+        self._tracker = tracker
+        self._parent = parent
+        self._siblings = len(parent.children)
+        self._start = start
+        self._action: "ActionNode | None" = None
+
+    def __getattr__(self, name: str):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        self._enter()
+        try:
+            create_module = getattr(self._loader, "create_module", None)
+            return None if create_module is None else create_module(spec)
+        except BaseException:
+            self._finish(None)
+            raise
+
+    def exec_module(self, module):
+        self._enter()
+        try:
+            self._loader.exec_module(module)
+        finally:
+            self._finish(module)
+
+    def _enter(self):
+        tracker = self._tracker
+        if self._action is not None or tracker.current is None:
+            return
+        self._action = ActionNode(
+            tracker, tracker.current, "import " + self._spec.name, (), {}
+        )
+        self._action.__enter__()
+        if self._action.parent is self._parent and (
+            len(self._parent.children) == self._siblings + 1
+        ):
+            # Nothing was recorded since the lookup, which is part of the import
+            self._action.start = self._start
+
+    def _finish(self, module):
+        self._spec.loader = self._loader
+        if module is not None and getattr(module, "__loader__", None) is self:
+            module.__loader__ = self._loader
+        if self._action is not None and self._tracker.current is self._action:
+            self._action.__exit__(None, None, None)
+
+
+class ImportHook(MetaPathFinder):
+    """
+    Records every module import as an action named `import <module>`, nested
+    under the imports it happens in. The time spent finding and executing a
+    module is the length of its action, and its own time excludes the modules
+    it imported. Specs looked up without being executed are not recorded.
+
+    Imports are only recorded on the thread that installed the hook.
+    """
+
+    def __init__(self, tracker: "Tracker | None" = None):
+        """
+        Creates an uninstalled hook.
+
+        Args:
+            tracker: The tracker recording the imports, the active tracker of
+                each import by default.
+        """
+        self.tracker = tracker
+        self.thread = get_ident()
+
+    def install(self):
+        """
+        Puts the hook first in `sys.meta_path`.
+        """
+        if self not in sys.meta_path:
+            sys.meta_path.insert(0, self)
+
+    def uninstall(self):
+        """
+        Removes the hook from `sys.meta_path`.
+        """
+        if self in sys.meta_path:
+            sys.meta_path.remove(self)
+
+    def find_spec(self, fullname: str, path, target=None):
+        tracker = self.tracker or Tracker._active_tracker
+        if tracker is None or tracker.current is None or get_ident() != self.thread:
+            return None
+
+        parent = tracker.current
+        start = tracker.clock()
+        spec = None
+        for finder in sys.meta_path:
+            if finder is not self and hasattr(finder, "find_spec"):
+                spec = finder.find_spec(fullname, path, target)
+                if spec is not None:
+                    break
+        if spec is None:
+            # Not found here, the import machinery reports it
+            return None
+
+        if hasattr(spec.loader, "exec_module"):
+            # The action is entered when the module is created, not every
+            # looked up spec is executed
+            spec.loader = _TimedLoader(spec, tracker, parent, start)
+        elif tracker.current is parent:
+            # Loaded by a legacy loader, only the lookup is timed
+            action = ActionNode(tracker, parent, "import " + fullname, (), {})
+            action.__enter__()
+            action.start = start
+            action.__exit__(None, None, None)
+        return spec
+
+
+def install(tracker: "Tracker | None" = None) -> ImportHook:
+    """
+    Starts recording imports.
+
+    Args:
+        tracker: The tracker recording the imports, the active tracker of each
+            import by default.
+
+    Returns:
+        The installed hook, to pass to `uninstall`.
+    """
+    hook = ImportHook(tracker)
+    hook.install()
+    return hook
+
+
+def uninstall(hook: ImportHook):
+    """
+    Stops recording imports.
+
+    Args:
+        hook: The hook returned by `install`.
+    """
+    hook.uninstall()
+
+
+def profile_startup(output: str) -> Tracker:
+    """
+    Records the imports of the program in a dedicated tracker until it exits,
+    then writes them as `<output>.flamegraph.html` and `<output>.txt`.
+
+    Call it from the first lines of `__main__`, or set the `FLAMETRACKER_IMPORTS`
+    environment variable to the output path and import flametracker first.
+
+    The tracker is not left active, so the actions of the program are recorded
+    by its own trackers and not in the profile.
+
+    Args:
+        output: The output path, completed by a suffix per format.
+
+    Returns:
+        The tracker recording the imports.
+    """
+    tracker = Tracker(name="@imports")
+    tracker.start()
+    hook = install(tracker)
+
+    def write():
+        hook.uninstall()
+        tracker.finish()
+        with open(output + ".flamegraph.html", "w", encoding="utf-8") as f:
+            f.write(tracker.to_flamegraph(0))
+        with open(output + ".txt", "w", encoding="utf-8") as f:
+            f.write(tracker.to_str(0))
+
+    atexit.register(write)
+    return tracker
+
+
+def profile_from_environment() -> "Tracker | None":
+    """
+    Calls `profile_startup` if the `FLAMETRACKER_IMPORTS` environment variable
+    is set, with its value as the output path.
+
+    Returns:
+        The tracker recording the imports, if any.
+    """
+    output = environ.get(ENVIRONMENT_VARIABLE)
+    return profile_startup(output) if output else None
@@ -0,0 +1,137 @@
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+
+from flametracker.types import ActionNode, Tracker
+
+_start = attrgetter("start")
+
+
+class ActionIndex:
+    """
+    Indexes the finished actions of a tracker by group and by time as they
+    end, so the actions of a group, or running during a time range, are found
+    without scanning the whole tree.
+
+    Times are nanoseconds relative to the start of the tracker's root. Actions
+    folded by pruning, aggregates and events are not indexed.
+    """
+
+    __slots__ = ("tracker", "_starts", "_by_start", "_ends", "_by_end", "_groups")
+
+    def __init__(self, tracker: "Tracker"):
+        """
+        Creates an empty index.
+
+        Args:
+            tracker: The tracker whose actions are indexed.
+        """
+        self.tracker = tracker
+        self._starts: "list[int]" = []
+        self._by_start: "list[ActionNode]" = []
+        self._ends: "list[int]" = []
+        self._by_end: "list[ActionNode]" = []
+        self._groups: "dict[str, tuple[list[int], list[ActionNode]]]" = {}
+
+    def __len__(self):
+        return len(self._by_end)
+
+    def add(self, action: "ActionNode"):
+        """
+        Indexes an action that just ended. Actions end in clock order, and
+        start order only differs for the ancestors of the last indexed ones.
+
+        Args:
+            action: The finished action.
+        """
+        position = bisect_right(self._starts, action.start)
+        self._starts.insert(position, action.start)
+        self._by_start.insert(position, action)
+        self._ends.append(action.end)
+        self._by_end.append(action)
+
+        starts, actions = self._groups.setdefault(action.group, ([], []))
+        position = bisect_right(starts, action.start)
+        starts.insert(position, action.start)
+        actions.insert(position, action)
+
+    def groups(self) -> "list[str]":
+        """
+        Lists the indexed groups.
+
+        Returns:
+            The groups, in the order of their first finished action.
+        """
+        return list(self._groups)
+
+    def by_group(self, group: str) -> "list[ActionNode]":
+        """
+        Finds the finished actions of a group.
+
+        Args:
+            group: The group of the actions.
+
+        Returns:
+            The actions, by start time.
+        """
+        return list(self._groups.get(group, ((), ()))[1])
+
+    def between(
+        self, start: int, end: int, group: "str | None" = None
+    ) -> "list[ActionNode]":
+        """
+        Finds the actions running during a time range: the finished actions
+        overlapping it, and the running actions started before its end.
+
+        Only the actions starting inside the range are searched through, the
+        ones started before are found among the ancestors of the first action
+        ending after its start, as actions of a thread are nested.
+
+        Args:
+            start: The start of the range.
+            end: The end of the range.
+            group: If set, only actions of this group are returned.
+
+        Returns:
+            The actions, by start time.
+        """
+        origin = self.tracker.root.start
+        start, end = start + origin, end + origin
+        if group is None:
+            starts, actions = self._starts, self._by_start
+        else:
+            starts, actions = self._groups.get(group, ([], []))
+
+        found = actions[bisect_left(starts, start) : bisect_left(starts, end)]
+
+        first = bisect_right(self._ends, start)
+        if first < len(self._by_end):
+            # Finished actions containing the start are its ancestors
+            for action in self.ancestors(self._by_end[first]):
+                if action.start < start and action.end != 0:
+                    found.append(action)
+        for action in self.ancestors(self.tracker.current):
+            if action.start < end and action.end == 0:
+                found.append(action)
+
+        if group is not None:
+            found = [action for action in found if action.group == group]
+        found.sort(key=_start)
+        return found
+
+    def ancestors(self, action: "ActionNode | None") -> "list[ActionNode]":
+        """
+        Finds the path of an action from the tracker's root.
+
+        Args:
+            action: The action.
+
+        Returns:
+            The actions from the root to the given one, included.
+        """
+        path = []
+        root = self.tracker.root
+        while action is not None:
+            path.append(action)
+            action = None if action is root else action.parent
+        path.reverse()
+        return path
@@ -0,0 +1,227 @@
+import sys
+from threading import Lock, Thread, main_thread
+from time import sleep
+from types import FrameType
+
+from flametracker.tracking import ActionNode, AggregateNode
+from flametracker.types import Tracker
+
+IGNORED_MODULES = ("flametracker",)
+"""Modules whose frames are left out of sampled stacks."""
+
+BOUNDARY_MODULES = ("runpy",)
+"""Modules whose frames and their callers are left out of sampled stacks."""
+
+
+def frame_module(frame: FrameType) -> str:
+    """
+    Names the module of the function running in a frame. Modules run as
+    `__main__` through `-m` keep their real name.
+
+    Args:
+        frame: The frame to name.
+
+    Returns:
+        The name of the module.
+    """
+    spec = frame.f_globals.get("__spec__")
+    if spec is not None:
+        return spec.name
+    return frame.f_globals.get("__name__", "?")
+
+
+def frame_group(frame: FrameType) -> str:
+    """
+    Names the function running in a frame.
+
+    Args:
+        frame: The frame to name.
+
+    Returns:
+        The module and qualified name of the function, as `module.qualname`.
+    """
+    code = frame.f_code
+    return frame_module(frame) + "." + getattr(code, "co_qualname", code.co_name)
+
+
+def in_packages(module: str, packages: "tuple[str, ...]") -> bool:
+    """
+    Checks whether a module belongs to one of the given packages.
+
+    Args:
+        module: The name of the module.
+        packages: The names of the packages.
+
+    Returns:
+        True if the module is one of the packages or one of their submodules.
+    """
+    return any(
+        module == package or module.startswith(package + ".") for package in packages
+    )
+
+
+class Instrumenter:
+    """
+    Records every call of the functions defined in selected packages as an
+    action of a tracker, using a profile hook on the tracker's thread.
+
+    Example:
+        with Tracker() as tracker:
+            with Instrumenter(tracker, ["mypackage"]):
+                mypackage.main()
+    """
+
+    def __init__(self, tracker: "Tracker", packages: "list[str]"):
+        """
+        Creates a stopped instrumenter.
+
+        Args:
+            tracker: The tracker recording the calls.
+            packages: The packages whose functions are recorded.
+        """
+        self.tracker = tracker
+        self.packages = tuple(packages)
+        self._modules: "dict[str, bool]" = {}
+        self._frames: "list[tuple[FrameType, ActionNode]]" = []
+        self._previous = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """
+        Installs the profile hook on the current thread.
+        """
+        self._previous = sys.getprofile()
+        sys.setprofile(self._profile)
+
+    def stop(self):
+        """
+        Removes the profile hook and ends the calls still running.
+        """
+        sys.setprofile(self._previous)
+        while self._frames:
+            self._frames.pop()[1].__exit__(None, None, None)
+
+    def _profile(self, frame: FrameType, event: str, arg):
+        if event == "call":
+            module = frame_module(frame)
+            matches = self._modules.get(module)
+            if matches is None:
+                matches = self._modules[module] = in_packages(module, self.packages)
+            if matches and self.tracker.current is not None:
+                action = ActionNode(
+                    self.tracker, self.tracker.current, frame_group(frame), (), {}
+                )
+                action.__enter__()
+                self._frames.append((frame, action))
+        elif event == "return":
+            if self._frames and self._frames[-1][0] is frame:
+                self._frames.pop()[1].__exit__(None, None, None)
+
+
+class Sampler:
+    """
+    Periodically samples the stack of a thread from a background thread, and
+    aggregates the samples by path under the root of a tracker.
+
+    Each sampled path adds the time elapsed since the previous sample to the
+    aggregates of its functions, so the tree approximates where time is spent
+    without slowing every call down like `Instrumenter`.
+    """
+
+    def __init__(self, tracker: "Tracker", interval: float = 0.001, thread=None):
+        """
+        Creates a stopped sampler.
+
+        Args:
+            tracker: The tracker whose root receives the samples.
+            interval: Delay in seconds between two samples.
+            thread: The sampled thread, the main thread by default.
+        """
+        self.tracker = tracker
+        self.interval = interval
+        self.thread = thread or main_thread()
+        self.samples = 0
+        self.lock = Lock()
+        self._children: "dict[ActionNode, dict[str, AggregateNode]]" = {}
+        self._stopping = False
+        self._thread: "Thread | None" = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def start(self):
+        """
+        Starts the sampling thread.
+        """
+        self._stopping = False
+        self._thread = Thread(target=self._run, name="flametracker-sampler")
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        """
+        Stops the sampling thread and ends the aggregates.
+        """
+        if self._thread is not None:
+            self._stopping = True
+            self._thread.join()
+            self._thread = None
+        with self.lock:
+            # Aggregates stay running while sampled, so their renders are not cached
+            for children in self._children.values():
+                for node in children.values():
+                    node.end = node.start + node.elapsed
+
+    def _run(self):
+        clock = self.tracker.clock
+        previous = clock()
+        while not self._stopping:
+            sleep(self.interval)
+            if self._stopping:
+                break
+            now = clock()
+            frame = sys._current_frames().get(self.thread.ident)  # type: ignore
+            if frame is not None:
+                self.add(frame, now - previous)
+            previous = now
+
+    def add(self, frame: FrameType, elapsed: int):
+        """
+        Adds a sampled stack to the aggregated tree.
+
+        Args:
+            frame: The innermost frame of the stack.
+            elapsed: The time in nanoseconds represented by the sample.
+        """
+        groups = []
+        while frame is not None:
+            module = frame_module(frame)
+            if in_packages(module, BOUNDARY_MODULES):
+                break
+            if not in_packages(module, IGNORED_MODULES):
+                groups.append(frame_group(frame))
+            frame = frame.f_back  # type: ignore
+
+        with self.lock:
+            self.samples += 1
+            parent = self.tracker.root
+            for group in reversed(groups):
+                children = self._children.setdefault(parent, {})
+                node = children.get(group)
+                if node is None:
+                    node = children[group] = AggregateNode(self.tracker, parent, group)
+                    node.start = self.tracker.root.start
+                node.count += 1
+                node.calls[group] += 1
+                node.elapsed += elapsed
+                parent = node
@@ -0,0 +1,191 @@
+from collections import deque
+from threading import Event, Thread
+from traceback import print_exc
+
+from flametracker.types import ActionNode
+
+
+class Listener:
+    """
+    Receives notifications about the actions recorded by a tracker.
+
+    Notifications are delivered in batches on a background thread, so the
+    action may still be running when `on_start` is called.
+    """
+
+    def on_start(self, action: "ActionNode"):
+        """
+        Called after an action started.
+
+        Args:
+            action: The started action.
+        """
+
+    def on_end(self, action: "ActionNode"):
+        """
+        Called after an action ended.
+
+        Args:
+            action: The ended action.
+        """
+
+    def on_event(self, action: "ActionNode"):
+        """
+        Called after an event was recorded.
+
+        Args:
+            action: The event node.
+        """
+
+
+class Dispatcher:
+    """
+    Queues notifications on the tracked thread and delivers them to listeners
+    from a background thread, so slow listeners never block the tracked code.
+    """
+
+    def __init__(self, max_pending: int = 100_000, interval: float = 0.05):
+        """
+        Creates a stopped dispatcher.
+
+        Args:
+            max_pending: Notifications queued beyond this are dropped and counted.
+            interval: Delay in seconds between two deliveries of queued batches.
+        """
+        self.registrations: "list[tuple[Listener, dict | None, bool]]" = []
+        self.max_pending = max_pending
+        self.interval = interval
+        self.dropped = 0
+        self._pending: "deque[tuple[str, ActionNode, tuple[Listener, ...]]]" = deque()
+        self._wake = Event()
+        self._stopping = False
+        self._thread: "Thread | None" = None
+
+    def register(
+        self,
+        listener: Listener,
+        thresholds: "dict[str, float] | None",
+        root_only: bool = False,
+    ):
+        """
+        Adds a listener.
+
+        Args:
+            listener: The listener to notify.
+            thresholds: If set, only actions of these groups are notified, and
+                `on_end` only when they lasted at least the given milliseconds.
+            root_only: Whether to only notify direct children of the root.
+        """
+        self.registrations.append((listener, thresholds, root_only))
+
+    def unregister(self, listener: Listener):
+        """
+        Removes a listener.
+
+        Args:
+            listener: The listener to remove.
+        """
+        self.registrations = [
+            registration
+            for registration in self.registrations
+            if registration[0] is not listener
+        ]
+
+    def started(self, action: "ActionNode"):
+        """
+        Queues the start notification of an action.
+        """
+        self._queue(
+            "on_start",
+            action,
+            tuple(
+                listener
+                for listener, thresholds, root_only in self.registrations
+                if (thresholds is None or action.group in thresholds)
+                and (not root_only or action.parent is action.tracker.root)
+            ),
+        )
+
+    def ended(self, action: "ActionNode"):
+        """
+        Queues the end notification of an action.
+        """
+        self._queue(
+            "on_end",
+            action,
+            tuple(
+                listener
+                for listener, thresholds, root_only in self.registrations
+                if (
+                    thresholds is None
+                    or (
+                        action.group in thresholds
+                        and action.length >= thresholds[action.group]
+                    )
+                )
+                and (not root_only or action.parent is action.tracker.root)
+            ),
+        )
+
+    def evented(self, action: "ActionNode"):
+        """
+        Queues the notification of an event.
+        """
+        self._queue(
+            "on_event",
+            action,
+            tuple(
+                listener
+                for listener, thresholds, root_only in self.registrations
+                if (thresholds is None or action.group in thresholds)
+                and (not root_only or action.parent is action.tracker.root)
+            ),
+        )
+
+    def _queue(self, method: str, action: "ActionNode", listeners: tuple):
+        if not listeners:
+            return
+        if len(self._pending) >= self.max_pending:
+            self.dropped += 1
+            return
+        self._pending.append((method, action, listeners))
+
+    def start(self):
+        """
+        Starts the delivery thread if it is not running.
+        """
+        if self._thread is None:
+            self._stopping = False
+            self._thread = Thread(
+                target=self._run, name="flametracker-dispatcher", daemon=True
+            )
+            self._thread.start()
+
+    def close(self):
+        """
+        Delivers the queued notifications and stops the delivery thread.
+        """
+        if self._thread is not None:
+            self._stopping = True
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            stopping = self._stopping
+            self._deliver()
+            if stopping:
+                return
+
+    def _deliver(self):
+        pending = self._pending
+        while pending:
+            method, action, listeners = pending.popleft()
+            for listener in listeners:
+                try:
+                    getattr(listener, method)(action)
+                except Exception:
+                    print_exc()
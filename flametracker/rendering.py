@@ -1,9 +1,11 @@
 from collections import Counter
-from json import dumps
-from math import floor, log10
+from math import ceil, floor, log10
 from typing import Literal
 
+from flametracker.encoding import decode_actions, dump_graph, encode_actions
+from flametracker.tracking import AggregateNode
 from flametracker.types import ActionNode
+from flametracker.viewer import render_html
 
 
 class RenderNode:
@@ -15,7 +17,7 @@ class RenderNode:
     __slots__ = (
         "avg_action_time",
         "group",
-        "length",
+        "elapsed",
         "action",
         "children",
         "calls",
@@ -32,13 +34,23 @@ class RenderNode:
     ):
 
         self.group = action.group
-        self.length = action.length
+        self.elapsed = action.elapsed
         self.action = action
         self.children = children
         self.calls = calls
         self.group_size = 1
         self.use_calls_as_value = use_calls_as_value
 
+    @property
+    def length(self) -> float:
+        """
+        Converts the duration of this node to milliseconds.
+
+        Returns:
+            The duration of this node.
+        """
+        return self.elapsed / 1_000_000
+
     def format_args(self, with_result=True):
         """
         Formats the arguments and result of the action for display.
@@ -68,21 +80,101 @@ class RenderNode:
         """
         assert self.action.group == other.action.group
         self.calls.update(other.calls)
-        if self.length > 0:
-            self.scale(1 + other.length / self.length, 1)
+        if self.elapsed > 0:
+            self.scale(self.elapsed + other.elapsed, self.elapsed, 1)
+
+    def copy(self, deep: bool = True) -> "RenderNode":
+        """
+        Creates a copy of this node, so it can be grouped without altering
+        a cached render.
+
+        Args:
+            deep: Whether to copy the children too, or only the list holding them.
+
+        Returns:
+            A new RenderNode instance.
+        """
+        node = RenderNode(
+            self.action,
+            Counter(self.calls),
+            [child.copy() for child in self.children] if deep else self.children[:],
+            self.use_calls_as_value,
+        )
+        node.elapsed = self.elapsed
+        node.group_size = self.group_size
+        return node
+
+    def merge_with(self, other: "RenderNode", owned: "set[int]"):
+        """
+        Merges another node of the same group into this one, and recursively
+        their children of the same group.
+
+        Args:
+            other: The other RenderNode to merge.
+            owned: Ids of the nodes created by the current merge, which can be
+                modified in place. Other descendants are copied before merging.
+        """
+        assert self.group == other.group
+        self.elapsed += other.elapsed
+        self.group_size += other.group_size
+        self.calls.update(other.calls)
+
+        positions = {child.group: i for i, child in enumerate(self.children)}
+        for child in other.children:
+            position = positions.get(child.group)
+            if position is None:
+                positions[child.group] = len(self.children)
+                self.children.append(child)
+            else:
+                target = self.children[position]
+                if id(target) not in owned:
+                    target = self.children[position] = target.copy(False)
+                    owned.add(id(target))
+                target.merge_with(child, owned)
 
-    def scale(self, length_factor: float, group_add: int):
+    @staticmethod
+    def merge_siblings(nodes: "list[RenderNode]") -> "list[RenderNode]":
+        """
+        Merges all nodes of the same group, adjacent or not, keeping the order
+        of their first occurrence.
+
+        Args:
+            nodes: The sibling nodes to merge.
+
+        Returns:
+            A list with one node per group.
+        """
+        merged: "list[RenderNode]" = []
+        positions: "dict[str, int]" = {}
+        owned: "set[int]" = set()
+
+        for node in nodes:
+            position = positions.get(node.group)
+            if position is None:
+                positions[node.group] = len(merged)
+                merged.append(node)
+            else:
+                target = merged[position]
+                if id(target) not in owned:
+                    target = merged[position] = target.copy(False)
+                    owned.add(id(target))
+                target.merge_with(node, owned)
+
+        return merged
+
+    def scale(self, numerator: int, denominator: int, group_add: int):
         """
         Scales the duration and group size of this node and its children.
 
         Args:
-            length_factor: The factor by which to scale the duration.
+            numerator: The numerator of the factor by which to scale the duration.
+            denominator: The denominator of the factor by which to scale the duration.
             group_add: The number of groups to add.
         """
-        self.length *= length_factor
+        self.elapsed = self.elapsed * numerator // denominator
         self.group_size += group_add
         for child in self.children:
-            child.scale(length_factor, self.group_size)
+            child.scale(numerator, denominator, self.group_size)
 
     def get_value(self):
         """
@@ -119,6 +211,30 @@ class RenderNode:
             "children": [child.to_dict() for child in self.children],
         }
 
+    def to_folded(self) -> str:
+        """
+        Converts this node and its children into the folded stacks format, with
+        one line per path of groups and its self time in microseconds.
+
+        Returns:
+            A string in the folded stacks format.
+        """
+        totals: "dict[str, int]" = {}
+        stack: "list[tuple[RenderNode, str]]" = [(self, self.group)]
+        while stack:
+            node, path = stack.pop()
+            own = node.elapsed - sum(child.elapsed for child in node.children)
+            totals[path] = totals.get(path, 0) + max(own, 0)
+            stack.extend(
+                (child, path + ";" + child.group) for child in reversed(node.children)
+            )
+
+        return "\n".join(
+            f"{path} {elapsed // 1000}"
+            for path, elapsed in totals.items()
+            if elapsed >= 1000
+        )
+
     def to_str(self, ignore_args):
         """
         Converts this node and its children into a string representation.
@@ -152,55 +268,23 @@ class RenderNode:
                 + f" {self.length:.2f}ms"
             )
 
-    def to_flamegraph(self, splited):
+    def to_flamegraph(
+        self, splited, offline=False, compact=False, compress=False, lod=None
+    ):
         """
         Converts this node and its children into a flamegraph HTML representation.
 
         Args:
             splited: Whether to split the flamegraph by root children.
+            offline: Whether to inline the viewer instead of loading d3 from a CDN.
+            compact: Whether to embed a string-tabled, columnar payload.
+            compress: Whether to gzip and base64 encode the payload (implies compact).
+            lod: If set, the maximum number of nodes per chunk. Deeper subtrees are
+                stored as chunks loaded lazily when zooming in (implies offline).
 
         Returns:
             A string containing the flamegraph HTML.
         """
-        base = """<!DOCTYPE html>
-<html>
-  <head>
-    <title>flametracker - flamegraph</title>
-    <meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
-    <meta name="viewport" content="width=device-width" />
-    <script>const data = /*data*/ [];</script>
-  <body>
-    <pre id="details"></pre>
-    <script type="module">
-      import {select} from "https://cdn.jsdelivr.net/npm/d3-selection@3.0.0/+esm";
-      import {flamegraph} from "https://cdn.jsdelivr.net/npm/d3-flame-graph@4.1.3/+esm"
-      import style from "https://cdn.jsdelivr.net/npm/d3-flame-graph@4.1.3/dist/d3-flamegraph.css" with {type: "css"}
-      style.insertRule("body {margin: 0; min-width: 960px; min-height: 100vh; display: flex; align-items: center; flex-wrap: wrap; justify-content: center}", 0)
-      style.insertRule("#details {width: 960px; height: 240px; padding: 5px; overflow-x: auto; background: white}")
-      document.adoptedStyleSheets.push(style)
-
-      const details = document.getElementById("details")
-
-      function label(d) {return `${d.data.name}\nlength: ${d.data.length}ms\ncalls: ${JSON.stringify(d.data.calls, null, 2)}`}
-      function detailsHandler(d) {if (d) {details.textContent = d}}
-
-      for (const graph of data) {
-        const graphDiv = document.createElement("div")
-
-        select(graphDiv)
-          .datum(graph)
-          .call(
-            flamegraph()
-              .sort(false)
-              .label(label)
-              .setDetailsHandler(detailsHandler)
-          );
-
-        document.body.insertBefore(graphDiv, details)
-      }
-    </script>
-  </body>
-</html>"""
         root = self.to_dict()
         if splited:
             data = []
@@ -211,14 +295,18 @@ class RenderNode:
         else:
             data = [root]
 
-        return base.replace(
-            "/*data*/ []",
-            dumps(data, check_circular=False, sort_keys=True),
+        return render_html(
+            [dump_graph(graph, compact, compress, lod) for graph in data],
+            offline or bool(lod),
         )
 
     @staticmethod
     def from_action(
-        action: "ActionNode", group_min_time: float, use_calls_as_value: dict | None
+        action: "ActionNode",
+        group_min_time: float,
+        use_calls_as_value: dict | None,
+        cache: "tuple[dict, dict]|None" = None,
+        merge_siblings: bool = False,
     ) -> "RenderNode":
         """
         Creates a RenderNode from an ActionNode.
@@ -227,41 +315,240 @@ class RenderNode:
             action: The ActionNode to render.
             group_min_time: Minimum time to group actions.
             use_calls_as_value: Whether to use call counts as values.
+            cache: Renders of finished actions from a previous call with the same
+                options, and the dictionary collecting them for the next call.
+            merge_siblings: Whether to merge all children of the same group, adjacent
+                or not, instead of grouping short adjacent ones.
 
         Returns:
             A RenderNode instance.
         """
+        if cache is not None:
+            rendered = cache[0].get(action)
+            if rendered is not None:
+                RenderNode._keep_render(action, rendered, cache[1])
+                return rendered
+
         children = [
-            RenderNode.from_action(child, group_min_time, use_calls_as_value)
+            RenderNode.from_action(
+                child, group_min_time, use_calls_as_value, cache, merge_siblings
+            )
             for child in action.children
         ]
-
-        calls = Counter((action.group,))
-
-        grouped_children: "list[RenderNode]" = []
-        group_buffer: "RenderNode|None" = None
+        if isinstance(action, AggregateNode):
+            calls = Counter(action.calls)
+        else:
+            calls = Counter((action.group,))
 
         for child in children:
             calls.update(child.calls)
 
-            if use_calls_as_value or group_min_time == 0:
-                grouped_children.append(child)
-            elif child.length > group_min_time:
-                if group_buffer:
-                    grouped_children.append(group_buffer)
-                    group_buffer = None
-                grouped_children.append(child)
-            elif group_buffer and group_buffer.group == child.group:
-                group_buffer.group_with(child)
-                if group_buffer.length > group_min_time:
-                    grouped_children.append(group_buffer)
-                    group_buffer = None
+        runs = RenderNode.partition(
+            children,
+            0 if use_calls_as_value else group_min_time * 1_000_000,
+            merge_siblings,
+        )
+        grouped_children = [
+            RenderNode.combine(run, merge_siblings, cache is not None) for run in runs
+        ]
+
+        rendered = RenderNode(action, calls, grouped_children, use_calls_as_value)
+        if isinstance(action, AggregateNode):
+            rendered.group_size = action.count
+        if cache is not None:
+            RenderNode._keep_render(action, rendered, cache[1])
+        return rendered
+
+    @staticmethod
+    def split_flamegraph(
+        action: "ActionNode",
+        group_min_time: float,
+        use_calls_as_value: dict | None,
+        merge_siblings: bool,
+        workers: int,
+        offline=False,
+        compact=False,
+        compress=False,
+        lod=None,
+    ) -> str:
+        """
+        Renders one flamegraph per child of an action, like `to_flamegraph` with
+        `splited`, building and encoding the graphs in a process pool.
+
+        The children are sent to the workers as compact payloads, in batches of
+        consecutive graphs, and the serialized graphs are stitched in order.
+
+        Args:
+            action: The ActionNode whose children are rendered.
+            group_min_time: Minimum time to group actions.
+            use_calls_as_value: Whether to use call counts as values.
+            merge_siblings: Whether to merge all siblings of the same group.
+            workers: The number of worker processes.
+            offline: Whether to inline the viewer instead of loading d3 from a CDN.
+            compact: Whether to embed a string-tabled, columnar payload.
+            compress: Whether to gzip and base64 encode the payload (implies compact).
+            lod: If set, the maximum number of nodes per lazily loaded chunk.
+
+        Returns:
+            A string containing the flamegraph HTML.
+        """
+        from concurrent.futures import ProcessPoolExecutor
+
+        root = RenderNode(
+            action, action.count_calls(), [], use_calls_as_value
+        ).to_dict()
+        runs = RenderNode.partition(
+            action.children,
+            0 if use_calls_as_value else group_min_time * 1_000_000,
+            merge_siblings,
+        )
+
+        batch_size = max(1, ceil(len(runs) / (workers * 4)))
+        with ProcessPoolExecutor(workers) as executor:
+            futures = [
+                executor.submit(
+                    _render_split_batch,
+                    encode_actions(
+                        [node for run in runs[i : i + batch_size] for node in run]
+                    ),
+                    [len(run) for run in runs[i : i + batch_size]],
+                    root,
+                    (group_min_time, use_calls_as_value, merge_siblings),
+                    (compact, compress, lod),
+                )
+                for i in range(0, len(runs), batch_size)
+            ]
+            graphs = [graph for future in futures for graph in future.result()]
+
+        return render_html(graphs, offline or bool(lod))
+
+    @staticmethod
+    def partition(nodes: list, min_elapsed: float, merge_siblings: bool) -> list:
+        """
+        Splits sibling nodes into the runs that are rendered as a single node.
+
+        Without `merge_siblings`, consecutive nodes of the same group are put
+        together while they are shorter than `min_elapsed`. This only reads
+        `group` and `elapsed`, so it applies to ActionNodes as well as RenderNodes.
+
+        Args:
+            nodes: The sibling nodes.
+            min_elapsed: Minimum time in nanoseconds to group nodes, 0 to disable.
+            merge_siblings: Whether to put all nodes of the same group together.
+
+        Returns:
+            The list of runs, each a list of nodes.
+        """
+        if merge_siblings:
+            groups: "dict[str, list]" = {}
+            for node in nodes:
+                groups.setdefault(node.group, []).append(node)
+            return list(groups.values())
+
+        if min_elapsed == 0:
+            return [[node] for node in nodes]
+
+        runs = []
+        buffer: "list | None" = None
+        buffer_elapsed = 0
+
+        for node in nodes:
+            if node.elapsed > min_elapsed:
+                if buffer:
+                    runs.append(buffer)
+                    buffer = None
+                runs.append([node])
+            elif buffer and buffer[0].group == node.group:
+                buffer.append(node)
+                if buffer_elapsed > 0:
+                    buffer_elapsed += node.elapsed
+                if buffer_elapsed > min_elapsed:
+                    runs.append(buffer)
+                    buffer = None
             else:
-                if group_buffer:
-                    grouped_children.append(group_buffer)
-                group_buffer = child
+                if buffer:
+                    runs.append(buffer)
+                buffer = [node]
+                buffer_elapsed = node.elapsed
+
+        if buffer:
+            runs.append(buffer)
+        return runs
+
+    @staticmethod
+    def combine(
+        run: "list[RenderNode]", merge_siblings: bool, shared: bool
+    ) -> "RenderNode":
+        """
+        Combines a run returned by `partition` into a single node.
+
+        Args:
+            run: The nodes to combine.
+            merge_siblings: Whether to merge the nodes instead of grouping them.
+            shared: Whether the nodes may be reused elsewhere, in which case
+                they are copied before being modified.
 
-        if group_buffer:
-            grouped_children.append(group_buffer)
+        Returns:
+            The combined node.
+        """
+        if len(run) == 1:
+            return run[0]
+        if merge_siblings:
+            return RenderNode.merge_siblings(run)[0]
+
+        node = run[0].copy() if shared else run[0]
+        for other in run[1:]:
+            node.group_with(other)
+        return node
+
+    @staticmethod
+    def _keep_render(action: "ActionNode", rendered: "RenderNode", renders: dict):
+        """
+        Keeps the render of a finished action whose parent is still running, as
+        the outermost render that can be reused by the next call. Aggregates
+        keep growing after their first fold, so they are never kept.
+        """
+        if isinstance(action, AggregateNode):
+            return
+        if action.end != 0 and (action.parent is None or action.parent.end == 0):
+            renders[action] = rendered
+
+
+def _render_split_batch(
+    payload: dict,
+    runs: "list[int]",
+    root: dict,
+    render_options: tuple,
+    dump_options: tuple,
+) -> "list[str]":
+    """
+    Renders a batch of split flamegraphs in a worker process.
+
+    Args:
+        payload: The children of the root, encoded by `encode_actions`.
+        runs: The number of children combined in each graph.
+        root: The rendered root, without children.
+        render_options: The options forwarded to `RenderNode.from_action`.
+        dump_options: The options forwarded to `dump_graph`.
+
+    Returns:
+        The serialized graphs.
+    """
+    group_min_time, use_calls_as_value, merge_siblings = render_options
+    actions = decode_actions(payload)
+
+    graphs = []
+    position = 0
+    for size in runs:
+        run = [
+            RenderNode.from_action(
+                action, group_min_time, use_calls_as_value, None, merge_siblings
+            )
+            for action in actions[position : position + size]
+        ]
+        position += size
 
-        return RenderNode(action, calls, grouped_children, use_calls_as_value)
+        graph = dict(root)
+        graph["children"] = [RenderNode.combine(run, merge_siblings, False).to_dict()]
+        graphs.append(dump_graph(graph, *dump_options))
+    return graphs
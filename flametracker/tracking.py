@@ -1,8 +1,17 @@
-from time import perf_counter
+from collections import Counter
+from time import monotonic_ns, perf_counter_ns, process_time_ns, thread_time_ns
 from typing import Optional
 
 from flametracker.types import Tracker
 
+CLOCKS = {
+    "perf": perf_counter_ns,
+    "monotonic": monotonic_ns,
+    "process": process_time_ns,
+    "thread": thread_time_ns,
+}
+"""Named clocks usable by trackers, all returning integer nanoseconds."""
+
 
 class ActionNode:
     """
@@ -16,6 +25,7 @@ class ActionNode:
         "group",
         "start",
         "end",
+        "elapsed",
         "args",
         "kargs",
         "result",
@@ -33,8 +43,9 @@ class ActionNode:
         self.tracker = tracker
         self.parent = parent
         self.group = group
-        self.start = 0.0
-        self.end = 0.0
+        self.start = 0
+        self.end = 0
+        self.elapsed = 0
         self.args = args
         self.kargs = kargs
         self.result = ()
@@ -46,12 +57,30 @@ class ActionNode:
     @property
     def length(self) -> float:
         """
-        Calculates the duration of the action in milliseconds.
+        Converts the duration of the action to milliseconds.
 
         Returns:
             The duration of the action.
         """
-        return (self.end - self.start) * 1000
+        return self.elapsed / 1_000_000
+
+    def count_calls(self) -> "Counter[str]":
+        """
+        Counts the actions of each group in this action's subtree.
+
+        Returns:
+            A counter of actions per group, including this one.
+        """
+        calls: "Counter[str]" = Counter()
+        stack: "list[ActionNode]" = [self]
+        while stack:
+            action = stack.pop()
+            if isinstance(action, AggregateNode):
+                calls.update(action.calls)
+            else:
+                calls[action.group] += 1
+            stack.extend(reversed(action.children))
+        return calls
 
     def set_result(self, result):
         """
@@ -69,9 +98,11 @@ class ActionNode:
         assert (
             self.tracker.current == self.parent
         ), "Tracker's current node does not match the parent node"
-        assert self.start == 0.0, "ActionNode has already been started"
-        self.start = perf_counter()
+        assert self.start == 0, "ActionNode has already been started"
+        self.start = self.tracker.clock()
         self.tracker.current = self
+        if self.tracker.dispatcher is not None:
+            self.tracker.dispatcher.started(self)
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -81,8 +112,16 @@ class ActionNode:
         assert (
             self.tracker.current == self
         ), "Tracker's current node does not match this node"
-        self.end = perf_counter()
+        self.end = self.tracker.clock()
+        self.elapsed = self.end - self.start
         self.tracker.current = self.parent
+        if self.tracker._aggregates:
+            self.tracker._aggregates.pop(self, None)
+        if self.tracker.dispatcher is not None:
+            self.tracker.dispatcher.ended(self)
+        folded = self.tracker.pruning and self.tracker.prune(self)
+        if self.tracker.index is not None and not folded:
+            self.tracker.index.add(self)
 
     @staticmethod
     def as_event(
@@ -112,6 +151,51 @@ class ActionNode:
         ), "Tracker's current node does not match the parent node."
 
         action = ActionNode(tracker, parent, group, args, kargs)
-        action.start, action.end = -1.0, -1.0
+        action.start, action.end = -1, -1
         action.set_result(result)
         return action
+
+
+class AggregateNode(ActionNode):
+    """
+    Represents finished actions of the same group folded together at capture
+    time, keeping only their count, total duration and call counts.
+    """
+
+    __slots__ = ("count", "calls")
+
+    def __init__(
+        self, tracker: "Tracker", parent: Optional["ActionNode"], group: str
+    ):
+        super().__init__(tracker, parent, group, (), {})
+        self.count = 0
+        self.calls: "Counter[str]" = Counter()
+
+    def fold(self, action: "ActionNode"):
+        """
+        Adds a finished action and its subtree to this aggregate.
+
+        Args:
+            action: The action to fold.
+        """
+        if not self.count:
+            self.start = action.start
+        self.end = action.end
+        self.count += 1
+        self.elapsed += action.elapsed
+        self.calls.update(action.count_calls())
+
+    def add(self, start: int, end: int):
+        """
+        Adds a finished call that was timed without creating an action.
+
+        Args:
+            start: The clock value when the call started.
+            end: The clock value when the call ended.
+        """
+        if not self.count:
+            self.start = start
+        self.end = end
+        self.count += 1
+        self.elapsed += end - start
+        self.calls[self.group] += 1
@@ -0,0 +1,248 @@
+HEAD = """<!DOCTYPE html>
+<html>
+  <head>
+    <title>flametracker - flamegraph</title>
+    <meta http-equiv="Content-Type" content="text/html; charset=UTF-8" />
+    <meta name="viewport" content="width=device-width" />
+    <script>const data = /*data*/ [];</script>
+  <body>
+    <pre id="details"></pre>"""
+
+LOADER = """
+      async function unpack(entry) {
+        if (typeof entry !== "string") {return entry}
+        if (entry.startsWith("gz:")) {
+          const bytes = Uint8Array.from(atob(entry.slice(3)), (c) => c.charCodeAt(0))
+          const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"))
+          entry = await new Response(stream).text()
+        }
+        return JSON.parse(entry)
+      }
+
+      function decode(payload) {
+        const strings = payload.s
+        const tables = payload.t.map((table) => {
+          const calls = {}
+          for (let i = 0; i < table.length; i += 2) {calls[strings[table[i]]] = table[i + 1]}
+          return calls
+        })
+        const roots = [], stack = []
+        for (let i = 0; i < payload.d.length; i++) {
+          const node = {name: strings[payload.n[i]], length: payload.l[i], value: payload.v[i], calls: tables[payload.c[i]], children: []}
+          if (payload.x && payload.x[i] !== -1) {node.chunk = payload.x[i]}
+          if (stack.length) {
+            const top = stack[stack.length - 1]
+            top[0].children.push(node)
+            if (--top[1] === 0) {stack.pop()}
+          } else {
+            roots.push(node)
+          }
+          if (payload.d[i]) {stack.push([node, payload.d[i]])}
+        }
+        return roots
+      }
+
+      async function load(entry) {
+        const graph = await unpack(entry.lod || entry)
+        return graph.s ? decode(graph)[0] : graph
+      }
+
+      function label(d) {return `${d.name}\\nlength: ${d.length}ms\\ncalls: ${JSON.stringify(d.calls, null, 2)}`}
+"""
+
+CDN_VIEWER = """
+    <script type="module">
+      import {select} from "https://cdn.jsdelivr.net/npm/d3-selection@3.0.0/+esm";
+      import {flamegraph} from "https://cdn.jsdelivr.net/npm/d3-flame-graph@4.1.3/+esm"
+      import style from "https://cdn.jsdelivr.net/npm/d3-flame-graph@4.1.3/dist/d3-flamegraph.css" with {type: "css"}
+      style.insertRule("body {margin: 0; min-width: 960px; min-height: 100vh; display: flex; align-items: center; flex-wrap: wrap; justify-content: center}", 0)
+      style.insertRule("#details {width: 960px; height: 240px; padding: 5px; overflow-x: auto; background: white}")
+      document.adoptedStyleSheets.push(style)
+
+      const details = document.getElementById("details")
+/*loader*/
+      function detailsHandler(d) {if (d) {details.textContent = d}}
+
+      for (const entry of data) {
+        const graph = await load(entry)
+        const graphDiv = document.createElement("div")
+
+        select(graphDiv)
+          .datum(graph)
+          .call(
+            flamegraph()
+              .sort(false)
+              .label((d) => label(d.data))
+              .setDetailsHandler(detailsHandler)
+          );
+
+        document.body.insertBefore(graphDiv, details)
+      }
+    </script>
+  </body>
+</html>"""
+
+OFFLINE_VIEWER = """
+    <style>
+      body {margin: 0; min-width: 960px; min-height: 100vh; display: flex; align-items: center; flex-wrap: wrap; justify-content: center; font: 12px Verdana, sans-serif}
+      canvas {display: block; margin: 10px 0; cursor: pointer}
+      #details {width: 960px; height: 240px; padding: 5px; overflow-x: auto; background: white}
+    </style>
+    <script type="module">
+      const ROW = 18, WIDTH = 960, MIN_WIDTH = 0.5, LOAD_WIDTH = 2
+      const details = document.getElementById("details")
+/*loader*/
+      function link(root) {
+        const stack = [root]
+        while (stack.length) {
+          const node = stack.pop()
+          for (const child of node.children) {
+            child.parent = node
+            stack.push(child)
+          }
+        }
+        return root
+      }
+
+      function color(name) {
+        let hash = 0
+        for (let i = 0; i < name.length; i++) {hash = (hash * 31 + name.charCodeAt(i)) | 0}
+        hash = Math.abs(hash)
+        return `rgb(${205 + hash % 50}, ${hash % 230}, ${(hash >> 8) % 55})`
+      }
+
+      class Viewer {
+        constructor(root, chunks) {
+          this.root = root
+          this.chunks = chunks
+          this.focus = root
+          this.boxes = []
+          this.canvas = document.createElement("canvas")
+          this.canvas.addEventListener("mousemove", (event) => {
+            const node = this.hit(event)
+            if (node) {details.textContent = label(node)}
+          })
+          this.canvas.addEventListener("click", (event) => {
+            const node = this.hit(event)
+            if (node) {this.zoom(node)}
+          })
+        }
+
+        zoom(node) {
+          this.focus = node
+          this.draw()
+        }
+
+        hit(event) {
+          const rect = this.canvas.getBoundingClientRect()
+          const x = event.clientX - rect.left, y = event.clientY - rect.top
+          for (const [bx, by, bw, node] of this.boxes) {
+            if (x >= bx && x < bx + bw && y >= by && y < by + ROW) {return node}
+          }
+          return null
+        }
+
+        expand(node, width) {
+          if (node.chunk !== undefined && width >= LOAD_WIDTH && !node.loading) {
+            node.loading = this.loadChunk(node).then(() => this.redraw())
+          }
+          return node.children
+        }
+
+        redraw() {
+          if (!this.scheduled) {
+            this.scheduled = requestAnimationFrame(() => {
+              this.scheduled = null
+              this.draw()
+            })
+          }
+        }
+
+        async loadChunk(node) {
+          const children = []
+          for (let index = node.chunk; index !== undefined;) {
+            const payload = await unpack(this.chunks[index])
+            children.push(...decode(payload))
+            index = payload.m
+          }
+          node.children = children
+          for (const child of node.children) {link(child).parent = node}
+          delete node.chunk
+        }
+
+        layout() {
+          const boxes = [], path = []
+          for (let node = this.focus; node; node = node.parent) {path.unshift(node)}
+          path.forEach((node, depth) => boxes.push([0, depth, WIDTH, node]))
+
+          const stack = [[this.focus, 0, WIDTH, path.length - 1]]
+          while (stack.length) {
+            const [node, x, width, depth] = stack.pop()
+            if (node !== this.focus) {boxes.push([x, depth, width, node])}
+            let childX = x
+            for (const child of this.expand(node, width)) {
+              const childWidth = node.value ? Math.min(width * child.value / node.value, x + width - childX) : 0
+              if (childWidth >= MIN_WIDTH) {stack.push([child, childX, childWidth, depth + 1])}
+              childX += childWidth
+            }
+          }
+          return boxes
+        }
+
+        draw() {
+          const boxes = this.layout()
+          const height = (boxes.reduce((depth, box) => Math.max(depth, box[1]), 0) + 1) * ROW
+          const ratio = window.devicePixelRatio || 1
+          this.canvas.width = WIDTH * ratio
+          this.canvas.height = height * ratio
+          this.canvas.style.width = `${WIDTH}px`
+          this.canvas.style.height = `${height}px`
+
+          const ctx = this.canvas.getContext("2d")
+          ctx.scale(ratio, ratio)
+          ctx.font = "12px Verdana, sans-serif"
+          ctx.textBaseline = "middle"
+          this.boxes = []
+          for (const [x, depth, width, node] of boxes) {
+            const y = height - (depth + 1) * ROW
+            this.boxes.push([x, y, width, node])
+            ctx.fillStyle = color(node.name)
+            ctx.fillRect(x, y, Math.max(width - 1, 0.5), ROW - 1)
+            if (width > 30) {
+              ctx.save()
+              ctx.beginPath()
+              ctx.rect(x, y, width - 4, ROW)
+              ctx.clip()
+              ctx.fillStyle = "black"
+              ctx.fillText(node.name, x + 3, y + ROW / 2)
+              ctx.restore()
+            }
+          }
+        }
+      }
+
+      for (const entry of data) {
+        const viewer = new Viewer(link(await load(entry)), entry.chunks || [])
+        document.body.insertBefore(viewer.canvas, details)
+        viewer.draw()
+      }
+    </script>
+  </body>
+</html>"""
+
+
+def render_html(graphs: "list[str]", offline: bool) -> str:
+    """
+    Builds the flamegraph HTML page around serialized graphs.
+
+    Args:
+        graphs: The graphs, each serialized as a JavaScript literal.
+        offline: Whether to use the bundled viewer instead of loading d3 from a CDN.
+
+    Returns:
+        A string containing the flamegraph HTML.
+    """
+    viewer = OFFLINE_VIEWER if offline else CDN_VIEWER
+    return (HEAD + viewer.replace("/*loader*/", LOADER)).replace(
+        "/*data*/ []", "[" + ", ".join(graphs) + "]", 1
+    )
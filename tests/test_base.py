@@ -1,7 +1,24 @@
-from time import sleep
+import _thread
+import gc
+import importlib.util
+import io
+import socket
+import sys
+import threading
+from threading import Thread
+from time import perf_counter, sleep
 
-from flametracker import Tracker, action, wrap
-from flametracker.tracking import ActionNode
+import pytest
+
+from flametracker import Listener, Tracker, action, wrap
+from flametracker.__main__ import main as cli_main
+from flametracker.__main__ import measured
+from flametracker.blocking import BlockingInstrumenter
+from flametracker.export import Collector, Exporter
+from flametracker.imports import install as install_imports
+from flametracker.instrument import Sampler
+from flametracker.encoding import decode_tree, encode_tree, pack, split_tree, unpack
+from flametracker.tracking import ActionNode, AggregateNode
 
 
 def test_action_node_timing():
@@ -177,3 +194,894 @@ def test_tracker_try_deactivate():
         assert tracker.try_deactivate() is False
     finally:
         Tracker._active_tracker = None
+
+
+def test_compact_payload_roundtrip():
+    with Tracker() as tracker:
+        for i in range(3):
+            with tracker.action("loop", i):
+                with tracker.action("inner"):
+                    pass
+
+    render_dict = tracker.to_dict(0)
+    payload = encode_tree([render_dict])
+    assert payload["s"].count("inner() -> ()") == 1
+    assert len(payload["n"]) == 7
+
+    (decoded,) = decode_tree(unpack(pack(payload, compress=True)))
+    assert decoded["name"] == render_dict["name"]
+    assert decoded["calls"] == {"@root": 1, "loop": 3, "inner": 3}
+    assert [child["name"] for child in decoded["children"]] == [
+        "loop(0) -> ()",
+        "loop(1) -> ()",
+        "loop(2) -> ()",
+    ]
+    assert decoded["children"][2]["length"] == float(
+        render_dict["children"][2]["length"]
+    )
+
+
+def test_tracker_to_flamegraph_offline():
+    with Tracker() as tracker:
+        with tracker.action("offline_action"):
+            sleep(0.01)
+
+    flamegraph = tracker.to_flamegraph(offline=True, compress=True)
+    assert "<!DOCTYPE html>" in flamegraph
+    assert "cdn.jsdelivr.net" not in flamegraph
+    assert "offline_action" not in flamegraph
+
+
+def test_split_tree_chunks():
+    with Tracker() as tracker:
+        for i in range(10):
+            with tracker.action("outer", i):
+                for j in range(10):
+                    with tracker.action("inner", j):
+                        pass
+
+    render_dict = tracker.to_dict(0)
+    chunks = split_tree([render_dict], 20)
+    top, cuts, following = chunks[0]
+    assert top == [render_dict] and following == -1
+    assert len(cuts) == 10
+    assert all(len(forest) == 10 for forest, _, _ in chunks[1:])
+
+    (decoded,) = decode_tree(encode_tree(top, cuts))
+    assert len(decoded["children"]) == 10
+    assert all("chunk" in child for child in decoded["children"])
+
+    flamegraph = tracker.to_flamegraph(0, lod=20)
+    assert "cdn.jsdelivr.net" not in flamegraph
+    assert '"chunks":[' in flamegraph
+
+    ticks = iter(range(0, 10**9, 1000))
+    with Tracker(clock=lambda: next(ticks)) as tracker:
+        for _ in range(6):
+            with tracker.action("outer"):
+                for j in range(8):
+                    with tracker.action("ab"[j % 2]):
+                        with tracker.action("leaf"):
+                            pass
+
+    flamegraph = tracker.to_flamegraph(0, True, lod=5)
+    allocated = [{} for _ in range(1000)]
+    assert tracker.to_flamegraph(0, True, lod=5) == flamegraph
+    assert tracker.to_flamegraph(0, True, lod=5, workers=2) == flamegraph
+
+    wide = {"name": "wide", "length": 1, "value": 1, "calls": {}, "children": []}
+    wide["children"] = [dict(wide, children=[]) for _ in range(250)]
+    chunks = split_tree([wide], 100)
+    assert [len(forest) for forest, _, _ in chunks] == [1, 100, 100, 50]
+    assert [following for _, _, following in chunks] == [-1, 2, 3, -1]
+    assert chunks[0][1] == {id(wide): 1}
+
+
+def test_tracker_render_cache():
+    tracker = Tracker()
+    tracker.activate()
+    try:
+        with tracker.action("first"):
+            pass
+        first = tracker.to_render(0, None).children[0]
+
+        with tracker.action("second"):
+            pass
+        render = tracker.to_render(0, None)
+        assert render.children[0] is first
+        assert [child.group for child in render.children] == ["first", "second"]
+    finally:
+        assert tracker.try_deactivate()
+
+    render = tracker.to_render(0.01, None)
+    assert tracker.to_render(0.01, None) is render
+    assert tracker.to_render(0.1, None) is not render
+
+    now = [0]
+    with Tracker(clock=lambda: now[0]) as tracker:
+        renders = []
+        for length in (3500, 4500, 5500, 7000):
+            with tracker.action("step"):
+                now[0] += 1000
+            now[0] = length
+            with measured(tracker):
+                renders.append(tracker.to_render(0.01, None).children[0])
+        assert renders[0] is renders[1] is renders[2]
+        assert renders[3] is not renders[2]
+
+
+def test_tracker_capture_pruning():
+    ticks = iter(range(0, 10**9, 1_000_000))
+
+    with Tracker(min_length=5, clock=lambda: next(ticks)) as tracker:
+        with tracker.action("slow"):
+            for _ in range(100):
+                with tracker.action("fast"):
+                    with tracker.action("faster"):
+                        pass
+        for _ in range(10):
+            with tracker.action("fast"):
+                pass
+
+    slow, fast = tracker.root.children
+    assert slow.group == "slow"
+    assert len(slow.children) == 1
+    assert isinstance(slow.children[0], AggregateNode)
+    assert slow.children[0].count == 100
+    assert slow.children[0].calls == {"fast": 100, "faster": 100}
+    assert isinstance(fast, AggregateNode) and fast.count == 10
+
+    render_dict = tracker.to_dict(0)
+    assert render_dict["calls"] == {"@root": 1, "slow": 1, "fast": 110, "faster": 100}
+    assert render_dict["children"][0]["children"][0]["name"] == "fast x100"
+
+
+def test_tracker_pruning_render_between_folds():
+    with Tracker(min_length=1000) as tracker:
+        with tracker.action("a"):
+            pass
+        assert tracker.to_dict(0)["children"][0]["calls"] == {"a": 1}
+        for _ in range(2):
+            with tracker.action("a"):
+                pass
+        assert tracker.to_dict(0)["children"][0]["calls"] == {"a": 3}
+
+        blocking = tracker.aggregate(tracker.root, "socket.recv")
+        blocking.add(tracker.clock(), tracker.clock())
+        assert tracker.to_dict(0)["children"][1]["calls"] == {"socket.recv": 1}
+        blocking.add(tracker.clock(), tracker.clock())
+
+    render = tracker.to_dict(0)
+    assert render["children"][0]["name"] == "a x3"
+    assert render["children"][1]["calls"] == {"socket.recv": 2}
+
+
+def test_tracker_depth_pruning():
+    with Tracker(max_depth=1) as tracker:
+        with tracker.action("top"):
+            for _ in range(3):
+                with tracker.action("deep"):
+                    with tracker.action("deeper"):
+                        pass
+
+    (top,) = tracker.root.children
+    (deep,) = top.children
+    assert isinstance(deep, AggregateNode)
+    assert deep.count == 3
+    assert deep.calls == {"deep": 3, "deeper": 3}
+
+
+def test_render_merge_siblings():
+    with Tracker() as tracker:
+        for i in range(50):
+            with tracker.action("a", i):
+                with tracker.action("leaf"):
+                    pass
+            with tracker.action("b", i):
+                with tracker.action("leaf" if i % 2 else "other"):
+                    pass
+
+    render = tracker.to_render(0, None, merge_siblings=True)
+    a, b = render.children
+    assert (a.group, a.group_size) == ("a", 50)
+    assert (b.group, b.group_size) == ("b", 50)
+    assert [(child.group, child.group_size) for child in a.children] == [("leaf", 50)]
+    assert [(child.group, child.group_size) for child in b.children] == [
+        ("other", 25),
+        ("leaf", 25),
+    ]
+    assert render.calls == {"@root": 1, "a": 50, "b": 50, "leaf": 75, "other": 25}
+    a_length = sum(child.length for child in tracker.root.children[::2])
+    assert abs(a.length - a_length) < 1e-6
+
+    unmerged = tracker.to_render(0, None)
+    assert len(unmerged.children) == 100
+    assert all(child.group_size == 1 for child in unmerged.children)
+
+
+def test_tracker_listeners():
+    class Recorder(Listener):
+        def __init__(self):
+            self.calls = []
+
+        def on_start(self, action):
+            self.calls.append(("start", action.group))
+
+        def on_end(self, action):
+            self.calls.append(("end", action.group))
+
+        def on_event(self, action):
+            self.calls.append(("event", action.group))
+
+    everything, slow = Recorder(), Recorder()
+    tracker = Tracker()
+    tracker.add_listener(everything)
+    tracker.add_listener(slow, thresholds={"request": 20})
+
+    with tracker:
+        with tracker.action("request"):
+            tracker.event("log")
+        with tracker.action("request"):
+            sleep(0.03)
+
+    assert everything.calls == [
+        ("start", "@root"),
+        ("start", "request"),
+        ("event", "log"),
+        ("end", "request"),
+        ("start", "request"),
+        ("end", "request"),
+        ("end", "@root"),
+    ]
+    assert slow.calls == [("start", "request"), ("start", "request"), ("end", "request")]
+    assert tracker.dispatcher.dropped == 0
+
+
+def test_exporter_to_collector(tmp_path):
+    collector = Collector(str(tmp_path / "collector.sock"))
+    Thread(target=collector.serve_forever, daemon=True).start()
+    exporter = Exporter(str(tmp_path / "collector.sock"), batch_size=2)
+
+    try:
+        for _ in range(2):
+            tracker = Tracker()
+            tracker.add_listener(exporter, root_only=True)
+            with tracker:
+                for i in range(3):
+                    with tracker.action("phase", i):
+                        with tracker.action("step"):
+                            pass
+                        with tracker.action("other"):
+                            pass
+                        with tracker.action("step"):
+                            pass
+        exporter.close()
+
+        for _ in range(100):
+            if collector.frames == 3:
+                break
+            sleep(0.01)
+    finally:
+        collector.shutdown()
+
+    assert (exporter.sent, exporter.dropped, exporter.failed) == (6, 0, 0)
+    render = collector.to_render()
+    (phase,) = render.children
+    assert phase.group_size == 6
+    assert [(child.group, child.group_size) for child in phase.children] == [
+        ("step", 12),
+        ("other", 6),
+    ]
+    assert render.calls == {"@root": 1, "phase": 6, "step": 12, "other": 6}
+
+
+def test_tracker_custom_clock():
+    ticks = iter(range(0, 10**9, 1000))
+
+    with Tracker(clock=lambda: next(ticks)) as tracker:
+        for _ in range(3):
+            with tracker.action("tick"):
+                pass
+
+    assert [child.elapsed for child in tracker.root.children] == [1000] * 3
+    assert tracker.root.elapsed == 7000
+    render = tracker.to_render(0.5, None)
+    assert render.children[0].group_size == 3
+    assert render.children[0].elapsed == 3000
+    assert render.elapsed == 7000
+
+    with Tracker(clock="thread") as tracker:
+        with tracker.action("cpu"):
+            sum(range(10**5))
+    assert tracker.root.children[0].elapsed > 0
+
+
+def test_nested_trackers():
+    with Tracker() as outer:
+        with outer.action("phase"):
+            with Tracker(forward=True, name="@inner") as inner:
+                with action("shared") as shared:
+                    pass
+                assert Tracker._active_tracker is inner
+            with Tracker() as isolated:
+                with action("private"):
+                    pass
+            assert Tracker._active_tracker is outer
+            with action("after"):
+                pass
+
+    assert Tracker._active_tracker is None
+    assert not inner.is_active() and not isolated.is_active()
+    phase = outer.root.children[0]
+    assert phase.children[0] is inner.root
+    assert inner.root.children == [shared]
+    assert [child.group for child in phase.children] == ["@inner", "after"]
+    assert [child.group for child in isolated.root.children] == ["private"]
+    assert outer.to_dict(0)["calls"] == {
+        "@root": 1,
+        "phase": 1,
+        "@inner": 1,
+        "shared": 1,
+        "after": 1,
+    }
+
+    with Tracker(clock="thread") as outer:
+        with outer.action("phase"):
+            with Tracker(forward=True) as inner:
+                with action("shared"):
+                    pass
+    assert inner.clock is outer.clock
+    events = outer.to_trace()["traceEvents"]
+    assert all(0 <= event["ts"] <= events[0]["dur"] for event in events)
+
+
+def test_tracker_to_flamegraph_workers():
+    ticks = iter(range(0, 10**9, 1000))
+
+    with Tracker(clock=lambda: next(ticks)) as tracker:
+        for i in range(12):
+            with tracker.action("step", i, key="value") as step:
+                for _ in range(i % 3):
+                    with tracker.action("inner"):
+                        pass
+                step.set_result([i])
+            if i % 4 == 0:
+                tracker.event("tick")
+
+    for options in ({}, {"compress": True}, {"merge_siblings": True}):
+        assert tracker.to_flamegraph(0, True, **options) == tracker.to_flamegraph(
+            0, True, workers=2, **options
+        )
+    assert tracker.to_flamegraph(0.5, True) == tracker.to_flamegraph(
+        0.5, True, workers=2
+    )
+
+
+def test_tracker_folded_and_trace():
+    ticks = iter(range(0, 10**9, 1_000_000))
+
+    with Tracker(clock=lambda: next(ticks)) as tracker:
+        with tracker.action("parent", 1):
+            with tracker.action("child"):
+                pass
+            tracker.event("marker")
+        with tracker.action("parent", 2):
+            pass
+
+    assert tracker.to_folded().split("\n") == [
+        "@root 3000",
+        "@root;parent 3000",
+        "@root;parent;child 1000",
+    ]
+
+    events = tracker.to_trace()["traceEvents"]
+    assert [(e["name"], e["ph"], e["ts"], e.get("dur")) for e in events] == [
+        ("@root", "X", 0, 7000),
+        ("parent", "X", 1000, 3000),
+        ("child", "X", 2000, 1000),
+        ("marker", "i", 3000, None),
+        ("parent", "X", 5000, 1000),
+    ]
+    assert events[1]["args"] == {"args": "1"}
+
+
+def test_cli_runs_script(tmp_path):
+    package = tmp_path / "clipkg"
+    package.mkdir()
+    (package / "__init__.py").write_text(
+        "def work(n):\n    return [step(i) for i in range(n)]\n"
+        "def step(i):\n    return i\n"
+    )
+    script = tmp_path / "script.py"
+    script.write_text(
+        "import sys, clipkg\nclipkg.work(3)\nsys.exit(len(sys.argv))\n"
+    )
+    output = str(tmp_path / "out")
+
+    status = cli_main(
+        ["-i", "clipkg", "-f", "folded", "-f", "text", "-o", output]
+        + [str(script), "a", "b"]
+    )
+
+    assert status == 3
+    sys.modules.pop("clipkg", None)
+    assert str(tmp_path) not in sys.path
+    paths = [line.rsplit(" ", 1)[0] for line in open(output + ".folded")]
+    assert "@root;clipkg.work" in paths
+    assert any(path.endswith("clipkg.step") for path in paths)
+    assert "clipkg.work()" in open(output + ".txt").read()
+
+    for option in ("--blocking", "--blocking-aggregate"):
+        sys.modules.pop("clipkg", None)
+        assert cli_main([option, "-f", "folded", "-o", output, str(script)]) == 1
+
+
+def test_sampler():
+    with Tracker() as tracker:
+        with Sampler(tracker, 0.001) as sampler:
+            deadline = perf_counter() + 0.05
+            while perf_counter() < deadline:
+                pass
+
+    assert sampler.samples > 0
+    sampled = tracker.root.children[0]
+    assert isinstance(sampled, AggregateNode)
+    assert 0 < sampled.elapsed <= tracker.root.elapsed
+    assert any(group.endswith(".test_sampler") for group in tracker.root.count_calls())
+
+
+def test_import_hook(tmp_path, monkeypatch):
+    (tmp_path / "hookouter.py").write_text("import hookinner\n")
+    (tmp_path / "hookinner.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+
+    with Tracker() as tracker:
+        hook = install_imports(tracker)
+        try:
+            import hookouter  # noqa: F401
+        finally:
+            hook.uninstall()
+    for name in ("hookouter", "hookinner"):
+        sys.modules.pop(name)
+
+    assert hook not in sys.meta_path
+    outer = tracker.root.children[0]
+    assert outer.group == "import hookouter"
+    assert [child.group for child in outer.children] == ["import hookinner"]
+    assert 0 < outer.children[0].elapsed < outer.elapsed
+    assert type(hookouter.__loader__).__name__ == "SourceFileLoader"
+    assert hookouter.__spec__.loader is hookouter.__loader__
+    assert "import hookinner" in tracker.to_str(0)
+
+    with Tracker() as lookup:
+        hook = install_imports(lookup)
+        try:
+            assert importlib.util.find_spec("hookinner") is not None
+            assert lookup.current is lookup.root
+        finally:
+            hook.uninstall()
+    assert lookup.root.children == []
+
+
+def test_profile_startup(tmp_path, monkeypatch):
+    import flametracker.imports
+
+    (tmp_path / "startupmod.py").write_text("VALUE = 1\n")
+    monkeypatch.syspath_prepend(str(tmp_path))
+    exits = []
+    monkeypatch.setattr(flametracker.imports.atexit, "register", exits.append)
+
+    @wrap
+    def work():
+        import startupmod  # noqa: F401
+
+    profile = flametracker.imports.profile_startup(str(tmp_path / "startup"))
+    assert Tracker._active_tracker is None
+    work()
+    sys.modules.pop("startupmod")
+    exits[0]()
+
+    assert not profile.is_active()
+    assert [child.group for child in profile.root.children] == ["import startupmod"]
+    text = (tmp_path / "startup.txt").read_text(encoding="utf-8")
+    assert "import startupmod" in text and "work" not in text
+
+    with Tracker() as outer:
+        side = Tracker(name="@side")
+        side.start()
+        with side.action("hooked"):
+            assert not side.finish()
+        assert Tracker._active_tracker is outer and side.finish()
+    assert [child.group for child in side.root.children] == ["hooked"]
+    assert outer.root.children == []
+
+
+def test_tracker_track_gc():
+    with Tracker(track_gc=True) as tracker:
+        with tracker.action("collect") as collect:
+            gc.collect()
+    gc.collect()
+
+    assert tracker._on_gc not in gc.callbacks
+    pause = collect.children[-1]
+    assert pause.group == "@gc"
+    assert pause.kargs["generation"] == 2
+    assert pause.kargs["uncollectable"] >= 0
+    assert 0 < pause.elapsed <= collect.elapsed
+    assert len(tracker.root.children) == 1
+    assert "@gc(generation=2, collected=" in tracker.to_str(0)
+
+
+def test_blocking_instrumenter(tmp_path):
+    path = str(tmp_path / "data.txt")
+
+    with Tracker() as tracker:
+        with BlockingInstrumenter():
+            lock, lock_line = threading.Lock(), sys._getframe().f_lineno
+            with open(path, "w") as f:
+                f.write("hello")
+
+            def hold():
+                with lock:
+                    sleep(0.02)
+
+            holder = Thread(target=hold)
+            holder.start()
+            while not lock.locked():
+                sleep(0.001)
+            with lock:
+                pass
+            holder.join()
+            with open(path) as f:
+                assert f.read() == "hello"
+            opened = []
+            opener = Thread(target=lambda: opened.append(open(path)))
+            opener.start()
+            opener.join()
+            opened[0].close()
+            assert isinstance(opened[0], io.TextIOBase)
+            event = threading.Event()
+            Thread(target=lambda: (sleep(0.01), event.set())).start()
+            event.wait()
+            event_line = sys._getframe().f_lineno - 1
+    assert threading.Lock is _thread.allocate_lock
+    assert open is io.open
+
+    write, wait, read = [
+        child
+        for child in tracker.root.children
+        if child.group in ("file.write", "lock.acquire", "file.read")
+    ]
+    assert (write.args, write.kargs) == ((path,), {"bytes": 5})
+    assert read.kargs == {"bytes": 5}
+    assert wait.args[0].endswith("test_base:" + str(lock_line))
+    assert wait.kargs["site"].endswith("test_base:" + str(lock_line + 12))
+    assert wait.elapsed > 0
+    sites = [
+        child.kargs["site"]
+        for child in tracker.root.children
+        if child.group == "condition.wait"
+    ]
+    assert all("test_base:" in site for site in sites)
+    assert sites[-1].endswith("test_base:" + str(event_line))
+
+    with Tracker() as tracker:
+        with BlockingInstrumenter(aggregate=True):
+            with tracker.action("reads"):
+                for _ in range(3):
+                    with open(path) as f:
+                        f.read()
+            for _ in range(10):
+                with tracker.action("request"):
+                    with open(path) as f:
+                        f.read()
+            assert tracker._aggregates == {}
+
+    aggregate = tracker.root.children[0].children[0]
+    assert isinstance(aggregate, AggregateNode)
+    assert aggregate.group == "file.read " + path
+    assert aggregate.count == 3
+    assert aggregate.kargs == {"bytes": 15}
+
+    if hasattr(socket, "AF_UNIX"):
+        address = str(tmp_path / "server.sock")
+        with Tracker() as tracker:
+            with BlockingInstrumenter(files=False, locks=False):
+                with socket.socket(socket.AF_UNIX) as server:
+                    server.bind(address)
+                    server.listen()
+                    with socket.socket(socket.AF_UNIX) as client:
+                        client.connect(address)
+                        connection = server.accept()[0]
+                        client.sendall(b"ping")
+                        assert connection.recv(4) == b"ping"
+                        connection.close()
+
+        calls = {child.group: child.kargs for child in tracker.root.children}
+        assert calls == {
+            "socket.connect": {},
+            "socket.accept": {},
+            "socket.send": {"bytes": 4},
+            "socket.recv": {"bytes": 4},
+        }
+
+
+def test_wrap_generators():
+    ticks = iter(range(0, 10**9, 1000))
+
+    @wrap
+    def numbers(count):
+        for i in range(count):
+            with action("produce", i):
+                pass
+            yield i
+        return "done"
+
+    @wrap(per_resume=True)
+    def echo():
+        received = yield "ready"
+        while received is not None:
+            received = yield received * 2
+
+    @wrap
+    def evens(count):
+        return (i for i in range(0, 2 * count, 2))
+
+    @wrap(per_resume=True)
+    def spanning():
+        with action("inner"):
+            yield 1
+            yield 2
+
+    @wrap(per_resume=True)
+    def closed():
+        with action("open"):
+            yield 1
+
+    with Tracker(clock=lambda: next(ticks)) as tracker:
+        with tracker.action("consume"):
+            assert list(numbers(3)) == [0, 1, 2]
+        replies = echo()
+        assert [next(replies), replies.send(2), replies.send(5)] == ["ready", 4, 10]
+        replies.close()
+        assert list(evens(2)) == [0, 2]
+        assert list(spanning()) == [1, 2]
+        abandoned = closed()
+        assert next(abandoned) == 1
+        abandoned.close()
+        assert tracker.current is tracker.root
+        started = numbers(3)
+        with tracker.action("first"):
+            assert next(started) == 0
+        first_render = tracker.to_dict(0)
+        assert list(started) == [1, 2]
+
+    local = "test_wrap_generators.<locals>."
+    generator = tracker.root.children[0].children[0]
+    assert isinstance(generator, AggregateNode)
+    assert generator.group == local + "numbers"
+    assert (generator.args, generator.count) == ((3,), 4)
+    assert generator.result == "done"
+    assert [child.group for child in generator.children] == ["produce"] * 3
+    assert generator.elapsed == 3 * 3000 + 1000
+    assert [child.group for child in tracker.root.children[1:4]] == [local + "echo"] * 3
+    assert tracker.root.children[4].group == local + "evens"
+    assert tracker.root.children[5].count == 3
+    render = tracker.to_dict(0)["children"][0]["children"][0]
+    assert render["name"] == local + "numbers x4"
+
+    spans = tracker.root.children[6:9]
+    assert [span.group for span in spans] == [local + "spanning"] * 3
+    assert [[child.group for child in span.children] for span in spans] == [
+        ["inner"]
+    ] * 3
+    assert all(span.children[0].end == span.end - 1000 for span in spans)
+    closes = tracker.root.children[9:11]
+    assert [span.group for span in closes] == [local + "closed"] * 2
+    assert [span.children[0].group for span in closes] == ["open"] * 2
+
+    first, rest = tracker.root.children[11:]
+    assert [first.group, first.children[0].count] == ["first", 1]
+    assert [rest.group, rest.count, rest.result] == [local + "numbers", 3, "done"]
+    assert first.elapsed >= first.children[0].elapsed
+    render = tracker.to_dict(0)["children"]
+    assert render[11] == first_render["children"][11]
+    assert render[11]["children"][0]["calls"] == {local + "numbers": 1, "produce": 1}
+    assert render[12]["name"] == local + "numbers x3"
+
+
+def test_wrap_generators_open_actions():
+    ticks = iter(range(0, 10**9, 1000))
+
+    @wrap
+    def rows():
+        with action("inner"):
+            for i in range(4):
+                with action("fetch"):
+                    pass
+                yield i
+
+    @wrap(per_resume=True)
+    def pages():
+        with action("inner"):
+            yield 1
+            yield 2
+
+    def check(action):
+        for child in action.children:
+            assert child.elapsed <= action.elapsed
+            check(child)
+
+    with Tracker(clock=lambda: next(ticks)) as tracker:
+        for generator in (rows(), pages()):
+            with tracker.action("first"):
+                next(generator)
+                with tracker.action("work"):
+                    pass
+            tracker.to_dict(0)
+            with tracker.action("second"):
+                for _ in generator:
+                    with tracker.action("work"):
+                        pass
+            tracker.to_dict(0)
+
+    check(tracker.root)
+    cached = tracker.to_dict(0)
+    tracker._renders.clear()
+    assert tracker.to_dict(0) == cached
+    folded = tracker.to_folded().splitlines()
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in folded) == 54
+    assert tracker.root.elapsed == 54000
+
+    first, second = tracker.root.children[:2]
+    assert [child.group for child in first.children[0].children] == ["inner"]
+    inner = second.children[0].children[0]
+    assert [inner.group, inner.elapsed] == ["inner", 10000]
+    assert [child.group for child in inner.children] == ["fetch"] * 3
+
+
+def test_recording_analytics():
+    np = pytest.importorskip("numpy")
+    from flametracker.analytics import Recording
+
+    now = [0]
+
+    def step(elapsed):
+        now[0] += elapsed
+
+    with Tracker(clock=lambda: now[0]) as tracker:
+        for i in range(6):
+            with tracker.action("work", i):
+                step(1000)
+                with tracker.action("parse"):
+                    step(40000 if i == 4 else 2000)
+                with tracker.action("work"):
+                    step(500)
+        tracker.event("done")
+        running = Recording.from_tracker(tracker)
+        assert list(running.elapsed[:2]) == [59000, 3500]
+        assert running.self_time.min() >= 0
+
+    recording = Recording.from_tracker(tracker)
+    assert recording.groups == ["@root", "work", "parse"]
+    assert len(recording) == 19
+    assert list(recording.parent[:7]) == [-1, 0, 1, 1, 0, 4, 4]
+    assert list(recording.depth[:4]) == [0, 1, 2, 2]
+    assert list(recording.start[:4]) == [0, 0, 1000, 3000]
+    assert list(recording.self_time[:4]) == [0, 1000, 2000, 500]
+
+    totals = recording.group_totals()
+    assert list(totals["group"]) == ["@root", "work", "parse"]
+    assert list(totals["count"]) == [1, 12, 6]
+    assert list(totals["elapsed"]) == [59000, 59000, 50000]
+    assert list(totals["self_time"]) == [0, 9000, 50000]
+
+    assert recording.top_paths(2) == [
+        ("@root;work;parse", 50000, 6),
+        ("@root;work", 6000, 6),
+    ]
+    assert list(recording.outliers()) == [13, 14]
+
+    window = recording.window(3500, 7000)
+    assert list(window.parent) == [-1, 0, 1, 1]
+    assert list(window.start) == [0, 3500, 4500, 6500]
+
+    imported = Recording.from_trace(tracker.to_trace())
+    assert imported.groups == recording.groups
+    for column in ("parent", "group", "start", "elapsed"):
+        assert np.array_equal(getattr(imported, column), getattr(recording, column))
+
+
+def test_tracker_index():
+    ticks = iter(range(0, 10**9, 1000))
+
+    with Tracker(clock=lambda: next(ticks), index=True) as tracker:
+        for i in range(3):
+            with tracker.action("load", i):
+                with tracker.action("parse_row"):
+                    pass
+        with tracker.action("save"):
+            running = tracker.index.between(3500, 20000)
+            assert [(action.group, action.start) for action in running] == [
+                ("@root", 0),
+                ("load", 1000),
+                ("load", 5000),
+                ("parse_row", 6000),
+                ("load", 9000),
+                ("parse_row", 10000),
+                ("save", 13000),
+            ]
+
+    index = tracker.index
+    assert len(index) == 8
+    assert index.groups() == ["parse_row", "load", "save", "@root"]
+    rows = index.by_group("parse_row")
+    assert [(row.start, row.end) for row in rows] == [
+        (2000, 3000),
+        (6000, 7000),
+        (10000, 11000),
+    ]
+    assert [(a.group, a.start) for a in index.between(2500, 6500)] == [
+        ("@root", 0),
+        ("load", 1000),
+        ("parse_row", 2000),
+        ("load", 5000),
+        ("parse_row", 6000),
+    ]
+    assert index.between(2500, 6500, "parse_row") == rows[:2]
+    assert index.ancestors(rows[1]) == [tracker.root, rows[1].parent, rows[1]]
+
+    restricted = tracker.restricted(rows[1:])
+    assert [load.args for load in restricted.root.children] == [(1,), (2,)]
+    assert restricted.root.elapsed == 2000
+    assert restricted.to_dict(0)["calls"] == {"@root": 1, "load": 2, "parse_row": 2}
+    assert tracker.restricted([tracker.root]).to_str(0) == tracker.to_str(0)
+
+
+def test_bench_regressions(tmp_path, monkeypatch, capsys):
+    from flametracker.bench import Benchmark, main as bench_main
+
+    baseline = Benchmark(
+        {
+            "@root": [1.0, 1.1, 0.9, 1.0],
+            "@root;work": [0.5, 0.6, 0.4, 0.5],
+            "@root;idle": [0.5, 0.5, 0.5, 0.5],
+        },
+        {"@root": 4, "@root;work": 8, "@root;idle": 4},
+    )
+    current = Benchmark(
+        {
+            "@root": [2.0, 2.1, 1.9, 2.0],
+            "@root;work": [1.5, 1.6, 1.4, 1.5],
+            "@root;idle": [0.5, 0.52, 0.5, 0.48],
+        },
+        {"@root": 4, "@root;work": 8, "@root;idle": 4},
+    )
+    assert current.regressions(baseline) == ["@root", "@root;work"]
+    assert baseline.regressions(current) == []
+    assert current.paths["@root;work"].interval > 0
+
+    baseline.save(str(tmp_path / "baseline.json"))
+    loaded = Benchmark.load(str(tmp_path / "baseline.json"))
+    assert loaded.to_dict() == baseline.to_dict()
+
+    (tmp_path / "bench_target.py").write_text(
+        "from time import sleep\n"
+        "from flametracker import action\n"
+        "def target():\n"
+        "    with action('work'):\n"
+        "        sleep(0.005)\n"
+    )
+    monkeypatch.syspath_prepend(str(tmp_path))
+    benchmark = Benchmark.run(__import__("bench_target").target, runs=3, warmup=1)
+    assert benchmark.runs == 3
+    assert benchmark.paths["@root;work"].calls == 3
+    assert benchmark.paths["@root;work"].mean >= 5
+
+    fast = Benchmark({"@root;work": [0.01, 0.011, 0.009]}, {"@root;work": 3})
+    fast.save(str(tmp_path / "fast.json"))
+    options = ["bench_target:target", "-n", "3", "-b", str(tmp_path / "fast.json")]
+    assert bench_main(options) == 1
+    assert bench_main(options + ["--update"]) == 0
+    assert bench_main(options + ["--threshold", "1"]) == 0
+    assert "@root;work" in capsys.readouterr().out